@@ -1,14 +1,27 @@
 from flask import Flask, jsonify
-from config import SECRET_KEY
+from config import SECRET_KEY, ENSURE_INDEXES_ON_STARTUP, METRICS_ENABLED, METRICS_TOKEN, PROFILER_ENABLED
 from controllers.auth import auth_bp
 from controllers.admin import admin_bp
 from controllers.student import student_bp
 from controllers.live_location import live_bp
 from controllers.notices import notices_bp
+from controllers.metrics import metrics_bp
+from commands import register_commands
+from utils.indexes import ensure_indexes_on_connect
+from utils.json_provider import BSONJSONProvider
+from db import db
+from utils import metrics
+from utils.profiler import profiler
 
 def create_app():
     app = Flask(__name__)
+    app.json = BSONJSONProvider(app)
     app.config['SECRET_KEY'] = SECRET_KEY
+    db.init_app(app)  # connects lazily, once per worker process
+    if METRICS_ENABLED:
+        metrics.init_app(app)
+    if PROFILER_ENABLED:
+        profiler.init_app(app)  # opt-in: adds a per-request sampling check
 
     # Register blueprints
     app.register_blueprint(auth_bp)
@@ -16,6 +29,15 @@ def create_app():
     app.register_blueprint(student_bp)
     app.register_blueprint(live_bp)
     app.register_blueprint(notices_bp)
+    if METRICS_ENABLED and METRICS_TOKEN:
+        app.register_blueprint(metrics_bp)
+
+    register_commands(app)
+
+    # indexes are created on the first connection of each process, not at import
+    db.on_connect(ensure_indexes_on_connect)
+    if ENSURE_INDEXES_ON_STARTUP:
+        db.database  # connect (and create indexes) now instead of on the first request
 
     @app.route('/')
     def home():
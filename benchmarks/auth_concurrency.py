@@ -0,0 +1,109 @@
+"""Hammer /register and /verify_otp from parallel clients and check for duplicate accounts.
+
+    python benchmarks/auth_concurrency.py [--emails 20] [--clients 8] [--mongo-uri mongodb://localhost:27017/]
+
+Without --mongo-uri the app runs against mongomock. With a URI, a scratch
+database (auth_concurrency) is used and dropped afterwards. mongomock's
+find-and-modify is not atomic across threads, so there the unique indexes do
+all the work and an occasional 500 from mongomock itself is expected; run
+against a real mongod to measure the atomic path. The exit status is 0 when
+every email ends up with exactly one account and no pending registration.
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "auth-concurrency-harness-secret-key-0000")
+os.environ.setdefault("EMAIL_BACKEND", "console")
+os.environ.setdefault("EMAIL_OUTBOX", "false")
+os.environ.setdefault("PASSWORD_HASH_EXECUTOR", "inline")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("ENSURE_INDEXES_ON_STARTUP", "false")
+
+def setup(mongo_uri):
+    import pymongo
+    if mongo_uri:
+        client = pymongo.MongoClient(mongo_uri)
+    else:
+        import mongomock
+        pymongo.MongoClient = mongomock.MongoClient
+        client = mongomock.MongoClient()
+    from db import db
+    db.configure(client=client, name="auth_concurrency")
+    from app import create_app
+    from utils.indexes import ensure_indexes
+    ensure_indexes()
+    return create_app(), db
+
+def run_parallel(fn, jobs, clients):
+    barrier = threading.Barrier(clients)
+    results = collections.Counter()
+    lock = threading.Lock()
+
+    def worker(my_jobs):
+        barrier.wait()  # start together to maximise overlap
+        for job in my_jobs:
+            status = fn(*job)
+            with lock:
+                results[status] += 1
+
+    threads = [threading.Thread(target=worker, args=(jobs[i::clients],)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return dict(results), time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=8, help="parallel clients, each retries every email")
+    parser.add_argument("--mongo-uri")
+    args = parser.parse_args()
+
+    app, db = setup(args.mongo_uri)
+    emails = [f"student{i}@example.com" for i in range(args.emails)]
+
+    def register(email):
+        r = app.test_client().post("/register", json={
+            "name": "Student", "email": email, "mobile": "1", "password": "secret123", "role": "student"})
+        return f"register {r.status_code}"
+
+    def verify(email):
+        otp = (db.pending_users.find_one({"email": email}, {"otp": 1}) or {}).get("otp", "000000")
+        r = app.test_client().post("/verify_otp", json={"email": email, "otp": otp})
+        return f"verify {r.status_code}"
+
+    jobs = [(e,) for e in emails for _ in range(args.clients)]
+    register_results, register_seconds = run_parallel(register, jobs, args.clients)
+    verify_results, verify_seconds = run_parallel(verify, jobs, args.clients)
+
+    duplicates = list(db.users.aggregate([
+        {"$group": {"_id": "$email", "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ]))
+    report = {
+        "emails": args.emails,
+        "clients": args.clients,
+        "register": register_results,
+        "register_seconds": round(register_seconds, 3),
+        "verify": verify_results,
+        "verify_seconds": round(verify_seconds, 3),
+        "users": db.users.count_documents({}),
+        "pending_left": db.pending_users.count_documents({}),
+        "duplicate_emails": len(duplicates),
+    }
+    print(json.dumps(report, indent=2))
+    if args.mongo_uri:
+        db.client.drop_database("auth_concurrency")
+    ok = report["users"] == args.emails and not duplicates and report["pending_left"] == 0
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Throughput and p50/p95/p99 latency of the hot tracking and auth endpoints.
+
+    python benchmarks/bench_endpoints.py [--buses 200] [--students 2000] [--fixes 100000]
+        [--requests 2000] [--login-requests 20] [--scenarios post_location,get_locations,...]
+        [--mongo-uri mongodb://localhost:27017/] [--output results.json]
+
+Requests go through the Flask test client, so the numbers cover routing,
+token_required, the handler and the database, but not a WSGI server or the
+network. Without --mongo-uri everything runs against mongomock, which is
+good for comparing code paths between commits but far slower than mongod
+per query; use a local mongod (and e.g. --fixes 10000000) for absolute
+numbers. Save results with --output and diff two runs with compare.py.
+"""
+import argparse
+import itertools
+import time
+
+from common import add_db_arguments, setup, seed, login, token_headers, measure, write_results
+
+SCENARIOS = ("post_location", "get_locations", "get_locations_304", "list_notices", "token_required", "login")
+
+def check(response, *expected):
+    if response.status_code not in expected:
+        raise RuntimeError(f"{response.request.method} {response.request.path}: "
+                           f"{response.status_code} {response.get_data(as_text=True)[:200]}")
+    return response
+
+def bench_post_location(client, db, fleet, count):
+    drivers = [(token_headers(db, email), str(bus_id)) for email, bus_id in fleet["drivers"]]
+    rotation = itertools.cycle(drivers)
+    step = itertools.count()
+
+    def call():
+        headers, bus_id = next(rotation)
+        offset = next(step) * 1e-6
+        check(client.post("/driver/location", headers=headers,
+                          json={"busId": bus_id, "latitude": 23.75 + offset, "longitude": 90.35 + offset}), 200, 202)
+    return measure(call, count)
+
+def bench_get_locations(client, db, fleet, count):
+    headers = token_headers(db, fleet["students"][0])
+    return measure(lambda: check(client.get("/locations", headers=headers), 200), count)
+
+def bench_get_locations_304(client, db, fleet, count):
+    # polling client that already has the current snapshot
+    headers = token_headers(db, fleet["students"][0])
+    etag = check(client.get("/locations", headers=headers), 200).headers["ETag"]
+    headers = dict(headers, **{"If-None-Match": etag})
+    return measure(lambda: check(client.get("/locations", headers=headers), 304), count)
+
+def bench_list_notices(client, db, fleet, count):
+    headers = token_headers(db, fleet["students"][0])
+    return measure(lambda: check(client.get("/notices?limit=20", headers=headers), 200), count)
+
+def bench_token_required(app, db, fleet, count):
+    """Cost of the decorator alone: a decorated no-op against the bare no-op."""
+    from utils.decorators import token_required
+    headers = token_headers(db, fleet["students"][0])
+
+    def view(current_user=None):
+        return None
+    guarded = token_required(roles=["student", "admin", "driver"])(view)
+
+    with app.test_request_context("/", headers=headers):
+        if guarded() is not None:
+            raise RuntimeError("token_required rejected the benchmark token")
+        bare = measure(view, count)
+        decorated = measure(guarded, count)
+    decorated["overhead_p50_us"] = round((decorated["p50_ms"] - bare["p50_ms"]) * 1000, 2)
+    return decorated
+
+def bench_login(client, fleet, count):
+    emails = itertools.cycle(fleet["students"][:100])
+    return measure(lambda: login(client, next(emails)), count, warmup=1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buses", type=int, default=200)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--fixes", type=int, default=100000)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--notices", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=20, help="login runs the full password hash, keep it small")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    add_db_arguments(parser)
+    args = parser.parse_args()
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    app, db = setup(args.mongo_uri)
+    client = app.test_client()
+    started = time.perf_counter()
+    fleet = seed(db, buses=args.buses, students=args.students, fixes=args.fixes, posts=args.posts, notices=args.notices)
+    results = {"seed": {"buses": args.buses, "students": args.students, "fixes": fleet["fixes"],
+                        "posts": args.posts, "notices": args.notices,
+                        "seconds": round(time.perf_counter() - started, 2)}}
+
+    for name in scenarios:
+        if name == "token_required":
+            results[name] = bench_token_required(app, db, fleet, args.requests)
+        elif name == "login":
+            results[name] = bench_login(client, fleet, args.login_requests)
+        else:
+            results[name] = globals()["bench_" + name](client, db, fleet, args.requests)
+    write_results("endpoints", results, args)
+
+if __name__ == "__main__":
+    main()
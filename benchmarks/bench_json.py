@@ -0,0 +1,72 @@
+"""Compare per-field ObjectId conversion + jsonify with the BSON JSON provider.
+
+    python benchmarks/bench_json.py [--docs 10000] [--repeat 5]
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils.json_provider import BSONJSONProvider, orjson
+
+def make_docs(n):
+    now = datetime.datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "userId": ObjectId(),
+        "bloodType": "O+",
+        "quantity": "2 bags",
+        "hospital": "General Hospital",
+        "contactName": "Emergency Contact",
+        "contactPhone": "777-888-9999",
+        "description": "Urgent need for O+ blood",
+        "createdAt": now,
+        "status": "pending",
+    } for _ in range(n)]
+
+def per_field(provider, docs):
+    # what the handlers did before: mutate ids to strings, then jsonify
+    for d in docs:
+        d["_id"] = str(d["_id"])
+        d["userId"] = str(d["userId"])
+    return provider.dumps(docs)
+
+def best_of(fn, make_input, repeat):
+    timings = []
+    for _ in range(repeat):
+        data = make_input()
+        started = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask("bench_json")
+    default_provider = DefaultJSONProvider(app)
+    bson_provider = BSONJSONProvider(app)
+    docs = make_docs(args.docs)
+
+    results = {
+        "docs": args.docs,
+        "orjson": orjson is not None,
+        "per_field_seconds": best_of(lambda d: per_field(default_provider, d), lambda: copy.deepcopy(docs), args.repeat),
+        "provider_seconds": best_of(bson_provider.dumps, lambda: docs, args.repeat),
+    }
+    results["speedup"] = results["per_field_seconds"] / results["provider_seconds"]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Measure password verification cost (logins per second per core) per hashing setting.
+
+    python benchmarks/bench_password.py [--seconds 2] [--setting bcrypt:12 --setting sha256_crypt:535000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.helpers import build_password_context
+
+DEFAULT_SETTINGS = ["bcrypt:10", "bcrypt:11", "bcrypt:12", "bcrypt:13", "sha256_crypt:100000", "sha256_crypt:535000"]
+
+def measure(scheme, rounds, seconds):
+    kwargs = {"bcrypt_rounds": rounds} if scheme == "bcrypt" else {"sha256_rounds": rounds}
+    context = build_password_context(schemes=[scheme], **kwargs)
+    hashed = context.hash("correct horse battery staple")
+    verified = 0
+    started = time.perf_counter()
+    while True:
+        context.verify("correct horse battery staple", hashed)
+        verified += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            break
+    return {
+        "setting": f"{scheme}:{rounds}",
+        "ms_per_login": round(elapsed / verified * 1000, 2),
+        "logins_per_second_per_core": round(verified / elapsed, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2, help="time spent on each setting")
+    parser.add_argument("--setting", action="append", help="scheme:rounds, may be repeated")
+    args = parser.parse_args()
+
+    results = []
+    for setting in args.setting or DEFAULT_SETTINGS:
+        scheme, rounds = setting.split(":")
+        results.append(measure(scheme, int(rounds), args.seconds))
+    print(json.dumps({"cpu_count": os.cpu_count(), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
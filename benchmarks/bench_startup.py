@@ -0,0 +1,71 @@
+"""Measure worker boot cost: import time, create_app() time and first request.
+
+    python benchmarks/bench_startup.py [--runs 10] [--importtime 15]
+
+Each run is a fresh interpreter, as a newly forked or spawned worker would
+be. Index creation on startup is disabled so no database is needed; the
+run also checks that importing and creating the app opened no connection.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app()
+t2 = time.perf_counter()
+response = app.test_client().get("/")
+t3 = time.perf_counter()
+from db import db
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "create_app_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "status": response.status_code,
+    "connected": db._client is not None,
+}))
+"""
+
+def run_child(env):
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def slowest_imports(env, limit):
+    # -X importtime writes "self | cumulative | module" lines to stderr
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return [{"module": name.strip(), "cumulative_ms": round(us / 1000, 1), "depth": (len(name) - len(name.lstrip())) // 2}
+            for us, name in rows[:limit]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", type=int, default=15, help="list the N slowest imports (0 to skip)")
+    args = parser.parse_args()
+
+    env = dict(os.environ, ENSURE_INDEXES_ON_STARTUP="false", SECRET_KEY=os.environ.get("SECRET_KEY", "bench-startup"))
+    runs = [run_child(env) for _ in range(args.runs)]
+    report = {"runs": args.runs, "connected_at_startup": any(r["connected"] for r in runs)}
+    for key in ("import_ms", "create_app_ms", "first_request_ms"):
+        values = sorted(r[key] for r in runs)
+        report[key] = {"median": round(statistics.median(values), 1), "min": round(values[0], 1), "max": round(values[-1], 1)}
+    if args.importtime:
+        report["slowest_imports"] = slowest_imports(env, args.importtime)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Shared setup for the benchmark scripts: database choice, seeding, timing and results."""
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# quiet, self-contained defaults; anything already set in the environment wins
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-0000000000000000")
+os.environ.setdefault("EMAIL_BACKEND", "console")
+os.environ.setdefault("EMAIL_OUTBOX", "false")
+os.environ.setdefault("METRICS_DB_CALLS_WARN", "0")
+os.environ.setdefault("ENSURE_INDEXES_ON_STARTUP", "false")
+
+BENCH_DB_NAME = "bus_app_bench"
+PASSWORD = "benchmark-password"
+
+def setup(mongo_uri=None, db_name=BENCH_DB_NAME):
+    """Point the app at mongomock (default) or a scratch database on a real mongod.
+
+    Returns (app, db). The scratch database is dropped first so every run
+    starts from the same seed.
+    """
+    import pymongo
+    if mongo_uri:
+        client = pymongo.MongoClient(mongo_uri)
+        client.drop_database(db_name)
+    else:
+        import mongomock
+        pymongo.MongoClient = mongomock.MongoClient
+        client = mongomock.MongoClient()
+    from db import db
+    db.configure(client=client, name=db_name)
+    from app import create_app
+    from utils.indexes import ensure_indexes
+    ensure_indexes()
+    return create_app(), db
+
+def add_db_arguments(parser):
+    parser.add_argument("--mongo-uri", help="benchmark against this mongod instead of mongomock")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles (ms) for a list of per-call seconds."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+def measure(fn, count, warmup=5):
+    """Call fn() count times after a warmup and summarize the timings."""
+    for _ in range(min(warmup, count)):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def write_results(name, results, args):
+    """Print the results and, with --output, save them for compare.py."""
+    report = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "backend": "mongod" if getattr(args, "mongo_uri", None) else "mongomock",
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if getattr(args, "output", None):
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return report
+
+# Seeding
+
+def seed(db, buses=200, drivers=None, students=2000, fixes=100000, posts=2000, notices=200, batch_size=10000):
+    """Insert a realistic fleet and community data; returns ids the scenarios need.
+
+    One password hash is computed and shared by every seeded user, so seeding
+    thousands of accounts does not take minutes of bcrypt time.
+    """
+    from bson import ObjectId
+    from utils.helpers import hash_password
+    from utils.history import write_history
+    from utils.geo_index import point
+    from utils.locations import update_latest_locations
+
+    rng = random.Random(42)
+    now = datetime.datetime.utcnow()
+    password = hash_password(PASSWORD)
+    drivers = drivers or buses
+
+    bus_docs = [{"_id": ObjectId(), "bus_number": f"BUS-{i:03d}", "route": f"Route {i % 20}", "capacity": 40,
+                 "created_at": now, "updated_at": now} for i in range(buses)]
+    db.buses.insert_many(bus_docs)
+    bus_ids = [b["_id"] for b in bus_docs]
+
+    driver_docs = [{"_id": ObjectId(), "name": f"Driver {i}", "email": f"driver{i}@bench.local", "mobile": "0",
+                    "password": password, "role": "driver", "is_verified": True, "created_at": now,
+                    "driver_info": {"nid": str(i), "is_approved": True, "assigned_bus": bus_ids[i % buses]}}
+                   for i in range(drivers)]
+    student_docs = [{"_id": ObjectId(), "name": f"Student {i}", "email": f"student{i}@bench.local", "mobile": "0",
+                     "password": password, "role": "student", "is_verified": True,
+                     "created_at": now - datetime.timedelta(minutes=i),
+                     "student_info": {"department": "CSE", "subscription_status": "active"}} for i in range(students)]
+    admin = {"_id": ObjectId(), "name": "Admin", "email": "admin@bench.local", "mobile": "0", "password": password,
+             "role": "admin", "is_verified": True, "created_at": now}
+    for start in range(0, len(student_docs), batch_size):
+        db.users.insert_many(student_docs[start:start + batch_size])
+    db.users.insert_many(driver_docs + [admin])
+
+    # fixes: every bus reports every few seconds, newest ending now
+    per_bus = max(1, fixes // buses)
+    interval = 5
+    origin = {bus_id: (23.7 + rng.random() * 0.2, 90.3 + rng.random() * 0.2) for bus_id in bus_ids}
+    batch = []
+    latest = {}
+    inserted = 0
+    for step in range(per_bus):
+        timestamp = now - datetime.timedelta(seconds=(per_bus - step) * interval)
+        for i, bus_id in enumerate(bus_ids):
+            lat, lon = origin[bus_id]
+            origin[bus_id] = (lat + rng.uniform(-1, 1) * 1e-4, lon + rng.uniform(-1, 1) * 1e-4)
+            fix = {"_id": ObjectId(), "driverId": driver_docs[i % drivers]["_id"], "busId": bus_id,
+                   "latitude": lat, "longitude": lon, "geo": point(lat, lon), "timestamp": timestamp}
+            batch.append(fix)
+            latest[bus_id] = fix
+            if len(batch) >= batch_size:
+                write_history(batch)
+                inserted += len(batch)
+                batch = []
+    if batch:
+        write_history(batch)
+        inserted += len(batch)
+    update_latest_locations(latest.values())
+
+    post_collections = ("blood_requests", "housing_posts", "tutoring_posts")
+    for n, collection in enumerate(post_collections):
+        docs = [{"userId": student_docs[(i * 7) % students]["_id"], "title": f"Post {i}", "description": "x" * 200,
+                 "createdAt": now - datetime.timedelta(minutes=i), "status": "open"}
+                for i in range(posts // len(post_collections) + (n < posts % len(post_collections)))]
+        if docs:
+            db[collection].insert_many(docs)
+    db.academic_notices.insert_many([{"adminId": admin["_id"], "title": f"Notice {i}", "content": "y" * 500,
+                                      "createdAt": now - datetime.timedelta(hours=i)} for i in range(notices)])
+    return {
+        "bus_ids": bus_ids,
+        "drivers": [(d["email"], d["driver_info"]["assigned_bus"]) for d in driver_docs],
+        "students": [s["email"] for s in student_docs],
+        "admin": admin["email"],
+        "fixes": inserted,
+    }
+
+def login(client, email):
+    response = client.post("/login", json={"email": email, "password": PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f"login failed for {email}: {response.status_code} {response.get_json()}")
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+def token_headers(db, email):
+    """Authorization headers for a seeded user without paying for a password check."""
+    from utils.tokens import issue_access_token
+    return {"Authorization": "Bearer " + issue_access_token(db.users.find_one({"email": email}))}
@@ -0,0 +1,51 @@
+"""Diff two benchmark result files written with --output.
+
+    python benchmarks/compare.py before.json after.json [--threshold 10]
+
+Prints every scenario's throughput and latency percentiles side by side with
+the change in percent. Latency increases and throughput drops beyond
+--threshold percent are flagged, and the exit status is 1 if there are any.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("throughput_per_second", "p50_ms", "p95_ms", "p99_ms")
+
+def change(before, after):
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="percent change flagged as a regression")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before.get("benchmark") != after.get("benchmark") or before.get("backend") != after.get("backend"):
+        print(f"warning: comparing {before.get('benchmark')}/{before.get('backend')} "
+              f"with {after.get('benchmark')}/{after.get('backend')}")
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+
+    regressions = 0
+    for scenario, old in before["results"].items():
+        new = after["results"].get(scenario)
+        if not new or "p50_ms" not in old:
+            continue
+        print(f"\n{scenario}")
+        for metric in METRICS:
+            pct = change(old[metric], new[metric])
+            worse = pct is not None and (-pct if metric == "throughput_per_second" else pct) > args.threshold
+            regressions += worse
+            shown = "n/a" if pct is None else f"{pct:+.1f}%"
+            print(f"  {metric:<22} {old[metric]:>12} {new[metric]:>12} {shown:>9}{'  REGRESSION' if worse else ''}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
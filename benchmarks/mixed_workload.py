@@ -0,0 +1,107 @@
+"""Mixed load: students polling the live map and notices while drivers report fixes.
+
+    python benchmarks/mixed_workload.py [--students 50] [--drivers 20] [--duration 30]
+        [--poll-interval 2] [--report-interval 5] [--mongo-uri mongodb://localhost:27017/] [--output results.json]
+
+Each simulated user is a thread with its own test client. Students poll
+/locations with If-None-Match (as the app does) and open /notices every
+tenth poll; drivers post a fix for their assigned bus. Intervals are
+jittered so requests do not arrive in lockstep; pass 0 to hammer the app
+as fast as the threads allow. Latencies are reported per request kind,
+together with the status codes seen.
+"""
+import argparse
+import collections
+import random
+import threading
+import time
+
+from common import add_db_arguments, setup, seed, token_headers, summarize, write_results
+
+class Recorder:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def timed(self, kind, fn):
+        started = time.perf_counter()
+        response = fn()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[kind].append(elapsed)
+            self.statuses[kind][response.status_code] += 1
+        return response
+
+def pause(rng, interval, stop):
+    if interval:
+        stop.wait(interval * rng.uniform(0.5, 1.5))
+
+def student(app, headers, args, recorder, stop, seed_value):
+    rng = random.Random(seed_value)
+    client = app.test_client()
+    etag = None
+    polls = 0
+    pause(rng, args.poll_interval, stop)  # spread the first polls out
+    while not stop.is_set():
+        request_headers = dict(headers, **{"If-None-Match": etag}) if etag else headers
+        response = recorder.timed("get_locations", lambda: client.get("/locations", headers=request_headers))
+        etag = response.headers.get("ETag") or etag
+        polls += 1
+        if polls % 10 == 0:
+            recorder.timed("list_notices", lambda: client.get("/notices?limit=20", headers=headers))
+        pause(rng, args.poll_interval, stop)
+
+def driver(app, headers, bus_id, args, recorder, stop, seed_value):
+    rng = random.Random(seed_value)
+    client = app.test_client()
+    lat, lon = 23.7 + rng.random() * 0.2, 90.3 + rng.random() * 0.2
+    pause(rng, args.report_interval, stop)
+    while not stop.is_set():
+        lat, lon = lat + rng.uniform(-1, 1) * 1e-4, lon + rng.uniform(-1, 1) * 1e-4
+        body = {"busId": bus_id, "latitude": lat, "longitude": lon}
+        recorder.timed("post_location", lambda: client.post("/driver/location", headers=headers, json=body))
+        pause(rng, args.report_interval, stop)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=50, help="concurrent polling students")
+    parser.add_argument("--drivers", type=int, default=20, help="concurrent reporting drivers")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--poll-interval", type=float, default=2)
+    parser.add_argument("--report-interval", type=float, default=5)
+    parser.add_argument("--buses", type=int, default=200)
+    parser.add_argument("--seed-students", type=int, default=2000)
+    parser.add_argument("--fixes", type=int, default=100000)
+    add_db_arguments(parser)
+    args = parser.parse_args()
+
+    app, db = setup(args.mongo_uri)
+    fleet = seed(db, buses=max(args.buses, args.drivers), students=max(args.seed_students, args.students), fixes=args.fixes)
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=student, args=(app, token_headers(db, email), args, recorder, stop, i), daemon=True)
+               for i, email in enumerate(fleet["students"][:args.students])]
+    threads += [threading.Thread(target=driver, args=(app, token_headers(db, email), str(bus_id), args, recorder, stop, i), daemon=True)
+                for i, (email, bus_id) in enumerate(fleet["drivers"][:args.drivers])]
+
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    stop.wait(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    results = {"config": {"students": args.students, "drivers": args.drivers, "duration": args.duration,
+                          "poll_interval": args.poll_interval, "report_interval": args.report_interval,
+                          "buses": max(args.buses, args.drivers), "fixes": fleet["fixes"]}}
+    for kind, latencies in sorted(recorder.latencies.items()):
+        results[kind] = summarize(latencies, elapsed)
+        results[kind]["statuses"] = {str(code): n for code, n in sorted(recorder.statuses[kind].items())}
+    results["total"] = summarize([l for values in recorder.latencies.values() for l in values], elapsed)
+    write_results("mixed_workload", results, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Maintenance commands, run with: flask --app app <command>
+import sys
+import time
+import click
+
+def register_commands(app):
+    @app.cli.command("rebuild-latest-locations")
+    def rebuild_latest_locations_command():
+        from utils.locations import rebuild_latest_locations
+        count = rebuild_latest_locations()
+        print(f"bus_latest_location rebuilt: {count} buses")
+
+    @app.cli.command("apply-retention")
+    def apply_retention_command():
+        from utils.retention import apply_retention
+        result = apply_retention()
+        print(f"Retention applied: {result}")
+
+    @app.cli.command("migrate-location-buckets")
+    @click.option("--batch-size", default=5000, show_default=True)
+    @click.option("--keep-source", is_flag=True, help="Leave the migrated live_locations documents in place.")
+    def migrate_location_buckets_command(batch_size, keep_source):
+        from utils.retention import migrate_to_buckets
+        count = migrate_to_buckets(batch_size=batch_size, keep_source=keep_source)
+        print(f"Migrated {count} fixes into live_location_buckets")
+
+    @app.cli.command("ensure-indexes")
+    @click.option("--replace", is_flag=True, help="Recreate indexes whose options changed.")
+    @click.option("--prune", is_flag=True, help="Drop indexes that are no longer registered.")
+    def ensure_indexes_command(replace, prune):
+        from utils.indexes import ensure_indexes
+        for collection, name, status in ensure_indexes(replace=replace, prune=prune):
+            print(f"{collection}.{name}: {status}")
+
+    @app.cli.command("audit-indexes")
+    def audit_indexes_command():
+        from utils.indexes import audit_queries
+        failed = False
+        for finding in audit_queries():
+            status = ", ".join(finding["problems"]) or "ok"
+            print(f"{finding['query']:<28} {finding['collection']:<24} {status:<32} {' > '.join(finding['stages'])}")
+            failed = failed or bool(finding["problems"])
+        if failed:
+            sys.exit(1)
+
+    @app.cli.command("send-outbox")
+    def send_outbox_command():
+        # dedicated sender process; web workers also drain the outbox after enqueueing
+        from utils.outbox import outbox
+        outbox.start()
+        print(f"Email outbox running with {outbox.workers} workers, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(60)
+                print(f"Outbox: {outbox.stats()}")
+        except KeyboardInterrupt:
+            outbox.stop()
+
+    @app.cli.command("send-notice-digest")
+    @click.option("--days", default=7, show_default=True, help="Include notices posted in the last N days")
+    def send_notice_digest_command(days):
+        import datetime
+        from db import db
+        from utils.email import send_notice_digest
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        notices = list(db.academic_notices.find({"createdAt": {"$gte": since}}, {"title": 1, "content": 1, "createdAt": 1}).sort("createdAt", -1))
+        if not notices:
+            print("No new notices, nothing to send")
+            return
+        students = db.users.find({"role": "student", "is_verified": True}, {"email": 1, "name": 1})
+        count = send_notice_digest(students, notices)
+        print(f"Notice digest with {len(notices)} notices queued for {count} students")
@@ -3,9 +3,33 @@ from dotenv import load_dotenv
 
 load_dotenv()  # ← Loads .env file
 
+# MongoDB: one client per worker process, connected on first use
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "bus_app")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0)) or None  # 0 = no timeout
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")  # primary, primaryPreferred, secondaryPreferred, ...
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0)) or None  # max wait for a pooled connection
+# db_reads: listings, history and cache reloads; may be served by secondaries
+MONGO_READS_URI = os.getenv("MONGO_READS_URI", MONGO_URI)
+MONGO_READS_READ_PREFERENCE = os.getenv("MONGO_READS_READ_PREFERENCE", "secondaryPreferred")
+MONGO_READS_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_READS_MAX_STALENESS_SECONDS", 90))  # MongoDB minimum is 90; 0 = unbounded
+MONGO_READS_MAX_POOL_SIZE = int(os.getenv("MONGO_READS_MAX_POOL_SIZE", 50))
+# db_writes: location telemetry; w=0 is faster but hides write errors the ingest path relies on
+MONGO_WRITES_URI = os.getenv("MONGO_WRITES_URI", MONGO_URI)
+MONGO_WRITES_W = int(os.getenv("MONGO_WRITES_W", 1))
+MONGO_WRITES_JOURNAL = os.getenv("MONGO_WRITES_JOURNAL", "false").lower() == "true"
+MONGO_WRITES_MAX_POOL_SIZE = int(os.getenv("MONGO_WRITES_MAX_POOL_SIZE", 50))
+
 # JWT Settings
 SECRET_KEY = os.getenv("SECRET_KEY")
 JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", 15))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", 30))
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))  # how often workers pick up revocations made elsewhere
 
 # Email Settings (SMTP)
 SMTP_HOST = os.getenv("SMTP_HOST")
@@ -14,5 +38,86 @@ SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")  # App Password with spaces OK
 APP_NAME = os.getenv("APP_NAME", "BUS APP")
 
-# Optional: Resend (if you switch later)
-RESEND_API_KEY = os.getenv("RESEND_API_KEY")
\ No newline at end of file
+# Request metrics: /metrics (Prometheus) and a log line for requests with too many DB round trips
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # /metrics is served only when set; scrapers send "Authorization: Bearer <token>"
+METRICS_DB_CALLS_WARN = int(os.getenv("METRICS_DB_CALLS_WARN", 10))  # 0 disables the log
+
+# Request profiler (cProfile); when disabled nothing is installed
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0))  # fraction of selected requests to profile
+PROFILER_ENDPOINTS = [e.strip() for e in os.getenv("PROFILER_ENDPOINTS", "").split(",") if e.strip()]  # e.g. live.get_locations,auth.login; empty = all
+
+# The index registry (utils/indexes.py) is applied on each process's first MongoDB connection.
+# Set this to connect and apply it when the app starts instead of on the first request
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "false").lower() == "true"
+
+# Resend API key, used when EMAIL_BACKEND=resend
+RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+
+# Live tracking
+LIVE_CACHE_TTL = float(os.getenv("LIVE_CACHE_TTL", 2))  # seconds between fleet snapshot reloads
+LIVE_BROKER_BACKEND = os.getenv("LIVE_BROKER_BACKEND", "memory")  # "memory" or "redis"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LIVE_STREAM_HEARTBEAT = float(os.getenv("LIVE_STREAM_HEARTBEAT", 15))  # seconds
+LIVE_STREAM_QUEUE_SIZE = int(os.getenv("LIVE_STREAM_QUEUE_SIZE", 100))
+LOCATION_BATCH_MAX = int(os.getenv("LOCATION_BATCH_MAX", 500))  # fixes per /driver/locations/batch call
+
+# GPS ingest: "sync" writes each fix before responding, "async" queues it for a background flusher
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 0.5))  # seconds
+
+# Location history storage: "documents" (one doc per fix) or "buckets" (per-bus time windows)
+LOCATION_STORAGE = os.getenv("LOCATION_STORAGE", "documents")
+LOCATION_BUCKET_SECONDS = int(os.getenv("LOCATION_BUCKET_SECONDS", 3600))
+RETENTION_FULL_DAYS = int(os.getenv("RETENTION_FULL_DAYS", 7))  # keep every fix this long
+RETENTION_DOWNSAMPLE_SECONDS = int(os.getenv("RETENTION_DOWNSAMPLE_SECONDS", 60))  # then one fix per interval
+RETENTION_DELETE_DAYS = int(os.getenv("RETENTION_DELETE_DAYS", 90))  # then delete
+TRACK_MAX_DAYS = int(os.getenv("TRACK_MAX_DAYS", 7))  # longest range one /track call may request
+TRACK_DEFAULT_TOLERANCE = float(os.getenv("TRACK_DEFAULT_TOLERANCE", 10))  # meters
+
+# ETA engine
+ETA_DEFAULT_SPEED = float(os.getenv("ETA_DEFAULT_SPEED", 6))  # m/s when no live or schedule speed is known
+ETA_MIN_SPEED = float(os.getenv("ETA_MIN_SPEED", 1.5))  # m/s; slower live estimates fall back to the schedule
+ETA_ROUTE_CACHE_TTL = float(os.getenv("ETA_ROUTE_CACHE_TTL", 60))  # seconds
+SCHEDULE_UTC_OFFSET_MINUTES = int(os.getenv("SCHEDULE_UTC_OFFSET_MINUTES", 0))  # schedule times are local to this offset
+
+# "Buses near me": "memory" answers from a grid over the live cache, "mongo" uses the 2dsphere index
+NEARBY_BACKEND = os.getenv("NEARBY_BACKEND", "memory")
+NEARBY_MAX_RADIUS = float(os.getenv("NEARBY_MAX_RADIUS", 50000))  # meters
+
+# Resolved users cached by token_required
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 30))  # seconds; bounds staleness across workers
+
+# List endpoints
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", 20))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", 100))
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 30))  # seconds a filtered total is reused
+
+# Password hashing: the first scheme hashes new passwords, the others are only
+# verified and get upgraded on the next successful login
+PASSWORD_SCHEMES = [s.strip() for s in os.getenv("PASSWORD_SCHEMES", "bcrypt,sha256_crypt").split(",") if s.strip()]
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+SHA256_CRYPT_ROUNDS = int(os.getenv("SHA256_CRYPT_ROUNDS", 535000))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")  # "process" (pool of worker processes) or "inline"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 0))  # per web worker; 0 = CPU cores / WEB_CONCURRENCY
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))  # web worker processes per host (gunicorn reads the same variable)
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 16))  # per web worker; more answers 503
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+
+# Outgoing email
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "resend")  # "resend", "smtp", "file" or "console"
+EMAIL_FROM = os.getenv("EMAIL_FROM", "sub_bus <no-reply@resend.dev>")
+EMAIL_FILE_PATH = os.getenv("EMAIL_FILE_PATH", "sent_emails.jsonl")  # used by the "file" backend
+EMAIL_OUTBOX = os.getenv("EMAIL_OUTBOX", "true").lower() == "true"  # queue emails instead of sending inside the request
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", 2))
+EMAIL_RATE_PER_SECOND = float(os.getenv("EMAIL_RATE_PER_SECOND", 5))  # messages per second, per process; 0 = unlimited
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", 10))  # doubled after every failed attempt
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", 5))  # seconds between checks for queued mail
+EMAIL_TEMPLATE_DIR = os.getenv("EMAIL_TEMPLATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "email"))
+EMAIL_DEFAULT_LOCALE = os.getenv("EMAIL_DEFAULT_LOCALE", "en")  # used when a template has no variant for the requested locale
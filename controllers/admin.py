@@ -1,7 +1,17 @@
-from flask import Blueprint, request, jsonify
-from db import db
+from flask import Blueprint, request, jsonify, Response
+from db import db, HANDLES
 from bson import ObjectId
 from utils.decorators import token_required
+from utils.live_cache import live_cache
+from utils.eta import eta_engine
+from utils.principal_cache import principal_cache
+from utils.hashing import hashing
+from utils.profiler import profiler
+from config import PROFILER_ENABLED
+from utils.tokens import revoke_user, revocations
+from utils.pagination import keyset_page, projection_for, cached_count, wants_total, page_response
+from controllers.student import BLOOD_REQUEST_FIELDS, HOUSING_POST_FIELDS, TUTORING_POST_FIELDS
+from utils.streaming import stream_response, STREAM_FORMATS
 import datetime
 
 admin_bp = Blueprint('admin', __name__)
@@ -35,14 +45,13 @@ def get_bus(current_user, bus_id):
         return jsonify({"message": "Invalid bus ID format"}), 400
     if not bus:
         return jsonify({"message": "Bus not found"}), 404
-    bus["_id"] = str(bus["_id"])
     return jsonify(bus), 200
 
 @admin_bp.route('/buses/<bus_id>', methods=['PUT'])
 @token_required(roles=['admin'])
 def update_bus(current_user, bus_id):
     try:
-        _ = db.buses.find_one({"_id": ObjectId(bus_id)})
+        ObjectId(bus_id)
     except:
         return jsonify({"message": "Invalid bus ID format"}), 400
     data = request.get_json() or {}
@@ -64,10 +73,12 @@ def update_bus(current_user, bus_id):
 @token_required(roles=['admin'])
 def delete_bus(current_user, bus_id):
     try:
-        _ = db.buses.find_one({"_id": ObjectId(bus_id)})
+        ObjectId(bus_id)
     except:
         return jsonify({"message": "Invalid bus ID format"}), 400
     db.buses.delete_one({"_id": ObjectId(bus_id)})
+    db.bus_latest_location.delete_one({"busId": ObjectId(bus_id)})
+    live_cache.remove(bus_id)
     return jsonify({"message": "Bus deleted successfully"}), 200
 
 # Schedule endpoints
@@ -88,16 +99,21 @@ def create_schedule(current_user):
             return jsonify({"message": "Bus not found"}), 400
     except:
         return jsonify({"message": "Invalid bus ID format"}), 400
+    stops = _parse_stop_ids(data.get("stops", []))
+    if stops is None:
+        return jsonify({"message": "stops must be a list of existing stop IDs"}), 400
     schedule = {
         "bus_id": ObjectId(bus_id),
         "route": route,
         "departure_time": departure_time,
         "arrival_time": arrival_time,
         "days_of_week": days_of_week,
+        "stops": stops,
         "created_at": datetime.datetime.utcnow(),
         "updated_at": datetime.datetime.utcnow(),
     }
     res = db.schedules.insert_one(schedule)
+    eta_engine.invalidate_routes()
     return jsonify({"message": "Schedule created successfully", "schedule_id": str(res.inserted_id)}), 201
 
 @admin_bp.route('/schedules/<schedule_id>', methods=['GET'])
@@ -109,8 +125,6 @@ def get_schedule(current_user, schedule_id):
         return jsonify({"message": "Invalid schedule ID format"}), 400
     if not schedule:
         return jsonify({"message": "Schedule not found"}), 404
-    schedule["_id"] = str(schedule["_id"])
-    schedule["bus_id"] = str(schedule["bus_id"])
     return jsonify(schedule), 200
 
 @admin_bp.route('/schedules/<schedule_id>', methods=['PUT'])
@@ -144,19 +158,77 @@ def update_schedule(current_user, schedule_id):
         "days_of_week": days_of_week,
         "updated_at": datetime.datetime.utcnow(),
     }
+    if "stops" in data:
+        stops = _parse_stop_ids(data["stops"])
+        if stops is None:
+            return jsonify({"message": "stops must be a list of existing stop IDs"}), 400
+        updated_schedule["stops"] = stops
     db.schedules.update_one({"_id": ObjectId(schedule_id)}, {"$set": updated_schedule})
+    eta_engine.invalidate_routes()
     return jsonify({"message": "Schedule updated successfully"}), 200
 
 @admin_bp.route('/schedules/<schedule_id>', methods=['DELETE'])
 @token_required(roles=['admin'])
 def delete_schedule(current_user, schedule_id):
     try:
-        _ = db.schedules.find_one({"_id": ObjectId(schedule_id)})
+        ObjectId(schedule_id)
     except:
         return jsonify({"message": "Invalid schedule ID format"}), 400
     db.schedules.delete_one({"_id": ObjectId(schedule_id)})
+    eta_engine.invalidate_routes()
     return jsonify({"message": "Schedule deleted successfully"}), 200
 
+# Stops
+def _parse_stop_ids(values):
+    # ordered list of stop IDs -> ObjectIds, or None if any is invalid or unknown
+    if not isinstance(values, list):
+        return None
+    try:
+        ids = [ObjectId(v) for v in values]
+    except:
+        return None
+    if ids and db.stops.count_documents({"_id": {"$in": ids}}) != len(set(ids)):
+        return None
+    return ids
+
+@admin_bp.route('/stops', methods=['POST'])
+@token_required(roles=['admin'])
+def create_stop(current_user):
+    data = request.get_json() or {}
+    name = data.get("name")
+    latitude = data.get("latitude")
+    longitude = data.get("longitude")
+    if not name or not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        return jsonify({"message": "Missing required fields"}), 400
+    stop = {
+        "name": name,
+        "latitude": latitude,
+        "longitude": longitude,
+        "created_at": datetime.datetime.utcnow(),
+        "updated_at": datetime.datetime.utcnow(),
+    }
+    res = db.stops.insert_one(stop)
+    return jsonify({"message": "Stop created successfully", "stop_id": str(res.inserted_id)}), 201
+
+@admin_bp.route('/stops', methods=['GET'])
+@token_required(roles=['student', 'admin', 'driver'])
+def list_stops(current_user):
+    stops = list(db.stops.find())
+    return jsonify(stops), 200
+
+@admin_bp.route('/stops/<stop_id>', methods=['DELETE'])
+@token_required(roles=['admin'])
+def delete_stop(current_user, stop_id):
+    try:
+        obj = ObjectId(stop_id)
+    except:
+        return jsonify({"message": "Invalid stop ID format"}), 400
+    if db.schedules.find_one({"stops": obj}, {"_id": 1}):
+        return jsonify({"message": "Stop is used by a schedule"}), 400
+    db.stops.delete_one({"_id": obj})
+    eta_engine.invalidate_routes()
+    return jsonify({"message": "Stop deleted successfully"}), 200
+
 # Driver assignment
 @admin_bp.route('/drivers/<driver_id>/assign', methods=['PUT'])
 @token_required(roles=['admin'])
@@ -175,32 +247,126 @@ def assign_driver_to_bus(current_user, driver_id):
     except:
         return jsonify({"message": "Invalid ID format"}), 400
     db.users.update_one({"_id": ObjectId(driver_id)}, {"$set": {"driver_info.assigned_bus": ObjectId(bus_id)}})
+    principal_cache.invalidate(email=driver.get("email"))
+    # the bus is an access token claim; make the driver refresh to pick it up
+    revoke_user(driver["_id"], refresh_tokens=False)
     return jsonify({"message": f"Driver {driver_id} assigned to bus {bus_id} successfully"}), 200
 
 # Admin fetchers
 @admin_bp.route('/admin/blood_requests', methods=['GET'])
 @token_required(roles=['admin'])
 def list_blood_requests(current_user):
-    entries = list(db.blood_requests.find())
-    for e in entries:
-        e["_id"] = str(e["_id"])
-        e["userId"] = str(e["userId"])
-    return jsonify(entries), 200
+    export = request.args.get('export')
+    if export:
+        # whole collection, encoded straight from the cursor
+        if export not in STREAM_FORMATS:
+            return jsonify({"message": "export must be 'json' or 'ndjson'"}), 400
+        cursor = db.blood_requests.find({}, projection_for(BLOOD_REQUEST_FIELDS)).sort([("createdAt", -1), ("_id", -1)])
+        return stream_response(cursor.batch_size(1000), export)
+    try:
+        entries, next_cursor = keyset_page(db.blood_requests, projection=projection_for(BLOOD_REQUEST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.blood_requests, {}) if wants_total() else None
+    return page_response(entries, next_cursor, total)
 
 @admin_bp.route('/admin/housing_posts', methods=['GET'])
 @token_required(roles=['admin'])
 def list_housing_posts(current_user):
-    posts = list(db.housing_posts.find())
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        p["userId"] = str(p["userId"])
-    return jsonify(posts), 200
+    export = request.args.get('export')
+    if export:
+        # whole collection, encoded straight from the cursor
+        if export not in STREAM_FORMATS:
+            return jsonify({"message": "export must be 'json' or 'ndjson'"}), 400
+        cursor = db.housing_posts.find({}, projection_for(HOUSING_POST_FIELDS)).sort([("createdAt", -1), ("_id", -1)])
+        return stream_response(cursor.batch_size(1000), export)
+    try:
+        posts, next_cursor = keyset_page(db.housing_posts, projection=projection_for(HOUSING_POST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.housing_posts, {}) if wants_total() else None
+    return page_response(posts, next_cursor, total)
 
 @admin_bp.route('/admin/tutoring_posts', methods=['GET'])
 @token_required(roles=['admin'])
 def list_tutoring_posts(current_user):
-    posts = list(db.tutoring_posts.find())
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        p["userId"] = str(p["userId"])
-    return jsonify(posts), 200
+    export = request.args.get('export')
+    if export:
+        # whole collection, encoded straight from the cursor
+        if export not in STREAM_FORMATS:
+            return jsonify({"message": "export must be 'json' or 'ndjson'"}), 400
+        cursor = db.tutoring_posts.find({}, projection_for(TUTORING_POST_FIELDS)).sort([("createdAt", -1), ("_id", -1)])
+        return stream_response(cursor.batch_size(1000), export)
+    try:
+        posts, next_cursor = keyset_page(db.tutoring_posts, projection=projection_for(TUTORING_POST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.tutoring_posts, {}) if wants_total() else None
+    return page_response(posts, next_cursor, total)
+
+@admin_bp.route('/admin/principal_cache/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_principal_cache_stats(current_user):
+    return jsonify(principal_cache.stats()), 200
+
+@admin_bp.route('/admin/db/pools', methods=['GET'])
+@token_required(roles=['admin'])
+def get_db_pool_stats(current_user):
+    return jsonify({handle.label: handle.stats() for handle in HANDLES}), 200
+
+# Request profiler (per worker process; only when PROFILER_ENABLED)
+@admin_bp.route('/admin/profiler', methods=['GET', 'PUT', 'DELETE'])
+@token_required(roles=['admin'])
+def manage_profiler(current_user):
+    if not PROFILER_ENABLED:
+        return jsonify({"message": "Profiler is disabled (PROFILER_ENABLED)"}), 404
+    if request.method == 'PUT':
+        data = request.get_json() or {}
+        sample_rate = data.get("sample_rate")
+        endpoints = data.get("endpoints")
+        if sample_rate is not None and (not isinstance(sample_rate, (int, float)) or not 0 <= sample_rate <= 1):
+            return jsonify({"message": "sample_rate must be between 0 and 1"}), 400
+        if endpoints is not None and not (isinstance(endpoints, list) and all(isinstance(e, str) for e in endpoints)):
+            return jsonify({"message": "endpoints must be a list of endpoint names"}), 400
+        profiler.configure(sample_rate, endpoints)
+    elif request.method == 'DELETE':
+        profiler.reset()
+    return jsonify(profiler.summary()), 200
+
+@admin_bp.route('/admin/profiler/top', methods=['GET'])
+@token_required(roles=['admin'])
+def get_profiler_top(current_user):
+    if not PROFILER_ENABLED:
+        return jsonify({"message": "Profiler is disabled (PROFILER_ENABLED)"}), 404
+    endpoint = request.args.get('endpoint')
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    sort = request.args.get('sort', 'cumulative')
+    if not endpoint or sort not in ('cumulative', 'total'):
+        return jsonify({"message": "endpoint is required; sort is cumulative or total"}), 400
+    rows = profiler.top(endpoint, limit, sort)
+    if rows is None:
+        return jsonify({"message": "No profiles for this endpoint yet"}), 404
+    return jsonify(rows), 200
+
+@admin_bp.route('/admin/profiler/dump', methods=['GET'])
+@token_required(roles=['admin'])
+def download_profiler_dump(current_user):
+    # load with pstats.Stats("<file>") or snakeviz
+    if not PROFILER_ENABLED:
+        return jsonify({"message": "Profiler is disabled (PROFILER_ENABLED)"}), 404
+    endpoint = request.args.get('endpoint')
+    data = profiler.dump(endpoint) if endpoint else None
+    if data is None:
+        return jsonify({"message": "No profiles for this endpoint yet"}), 404
+    return Response(data, mimetype="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="{endpoint}.pstats"'})
+
+@admin_bp.route('/admin/hashing/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_hashing_stats(current_user):
+    return jsonify(hashing.stats()), 200
+
+@admin_bp.route('/admin/revocations/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_revocation_stats(current_user):
+    return jsonify(revocations.stats()), 200
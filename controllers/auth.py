@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify
+from pymongo.errors import DuplicateKeyError
 from db import db
-from utils.helpers import hash_password, verify_password
+from utils.hashing import hashing, HashingBusy
 from utils.email import send_otp_email, send_reset_email  # ← FIXED: BOTH IMPORTED
+from utils.principal_cache import principal_cache
+from utils.tokens import issue_tokens, use_refresh_token, revoke_refresh_token, revoke_access_token, revoke_user
 import datetime
 import jwt
 import random
@@ -12,6 +15,13 @@ from config import SECRET_KEY, JWT_ALGORITHM
 
 auth_bp = Blueprint('auth', __name__)
 
+@auth_bp.errorhandler(HashingBusy)
+def hashing_busy(e):
+    # Password hashing is saturated; tell clients to back off instead of queueing
+    response = jsonify({"message": "Too many authentication requests, retry shortly"})
+    response.headers["Retry-After"] = "2"
+    return response, 503
+
 # Generate 6-digit OTP
 def generate_otp():
     return ''.join(random.choices(string.digits, k=6))
@@ -29,14 +39,16 @@ def register():
     if not all([name, email, mobile, password, role]):
         return jsonify({"message": "Missing required fields"}), 400
 
-    if db.users.find_one({"email": email}):
+    if db.users.find_one({"email": email}, {"_id": 1}):
         return jsonify({"message": "Email already registered"}), 400
 
-    if db.pending_users.find_one({"email": email}):
+    # cheap indexed check so retries of an in-progress registration skip the hash;
+    # the unique index below still settles races
+    if db.pending_users.find_one({"email": email}, {"_id": 1}):
         return jsonify({"message": "Registration already in progress. Check your email for OTP."}), 400
 
     # Hash password
-    hashed_password = hash_password(password)
+    hashed_password = hashing.hash_password(password)
 
     # Generate OTP
     otp = generate_otp()
@@ -67,14 +79,17 @@ def register():
             "is_approved": False
         }
 
-    # Store in pending
-    db.pending_users.insert_one(user)
+    # Store in pending; the unique email index turns concurrent attempts into one
+    try:
+        pending_id = db.pending_users.insert_one(user).inserted_id
+    except DuplicateKeyError:
+        return jsonify({"message": "Registration already in progress. Check your email for OTP."}), 400
 
     # Send OTP via Email
     try:
         send_otp_email(email, name, otp)
     except Exception as e:
-        db.pending_users.delete_one({"email": email})
+        db.pending_users.delete_one({"_id": pending_id})
         return jsonify({"message": "Failed to send OTP email", "error": str(e)}), 500
 
     return jsonify({
@@ -91,30 +106,34 @@ def verify_otp():
 
     if not all([email, otp]):
         return jsonify({"message": "Email and OTP are required"}), 400
+    otp = str(otp)  # it goes into a query; never let an operator document through
 
-    # Find pending user
-    user = db.pending_users.find_one({"email": email})
+    # Claim the pending registration only if the OTP matches and is still valid;
+    # of several concurrent verifications exactly one gets the document
+    now = datetime.datetime.utcnow()
+    user = db.pending_users.find_one_and_delete({"email": email, "otp": otp, "otp_expiry": {"$gt": now}})
     if not user:
-        return jsonify({"message": "No registration found or already verified"}), 404
-
-    # Check OTP and expiry
-    if user.get("otp") != otp:
-        return jsonify({"message": "Invalid OTP"}), 400
-
-    if datetime.datetime.utcnow() > user["otp_expiry"]:
-        db.pending_users.delete_one({"email": email})
+        # Failure path only: find out why to keep the original error messages
+        pending = db.pending_users.find_one({"email": email}, {"otp": 1})
+        if not pending:
+            return jsonify({"message": "No registration found or already verified"}), 404
+        if pending.get("otp") != otp:
+            return jsonify({"message": "Invalid OTP"}), 400
+        db.pending_users.delete_one({"_id": pending["_id"]})
         return jsonify({"message": "OTP expired. Please register again."}), 400
 
     # OTP Valid → Move to users
     user["is_verified"] = True
-    user["email_verified_at"] = datetime.datetime.utcnow()
-    
+    user["email_verified_at"] = now
+
     # Remove OTP fields
     user.pop("otp", None)
     user.pop("otp_expiry", None)
 
-    db.users.insert_one(user)
-    db.pending_users.delete_one({"email": email})
+    try:
+        db.users.insert_one(user)
+    except DuplicateKeyError:
+        return jsonify({"message": "Email already registered"}), 400
 
     return jsonify({"message": "Email verified! Registration successful."}), 200
 
@@ -127,18 +146,17 @@ def resend_otp():
     if not email:
         return jsonify({"message": "Email is required"}), 400
 
-    user = db.pending_users.find_one({"email": email})
-    if not user:
-        return jsonify({"message": "No pending registration found"}), 404
-
     # Generate new OTP
     new_otp = generate_otp()
     new_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
 
-    db.pending_users.update_one(
+    user = db.pending_users.find_one_and_update(
         {"email": email},
-        {"$set": {"otp": new_otp, "otp_expiry": new_expiry}}
+        {"$set": {"otp": new_otp, "otp_expiry": new_expiry}},
+        projection={"name": 1}
     )
+    if not user:
+        return jsonify({"message": "No pending registration found"}), 404
 
     try:
         send_otp_email(email, user["name"], new_otp)
@@ -162,21 +180,57 @@ def login():
     if not user or not user.get("is_verified", False):
         return jsonify({"message": "Invalid credentials or unverified account"}), 401
 
-    if verify_password(password, user["password"]):
-        payload = {
-            'email': user['email'],
-            'role': user['role'],
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }
-        token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
+    valid, new_hash = hashing.verify_and_update(password, user["password"])
+    if valid:
+        if new_hash:
+            # Upgrade deprecated schemes / old cost settings; skip if the password changed meanwhile
+            db.users.update_one({"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+        tokens = issue_tokens(user)
         return jsonify({
             "message": "Login successful",
-            "token": token,
+            "token": tokens["access_token"],  # kept for older clients
+            **tokens,
             "role": user['role']
         }), 200
 
     return jsonify({"message": "Invalid credentials"}), 401
 
+# Exchange a refresh token for a new access/refresh pair (the old one is consumed)
+@auth_bp.route('/token/refresh', methods=['POST'])
+def refresh_token():
+    data = request.get_json() or {}
+    token = data.get("refresh_token")
+    if not token:
+        return jsonify({"message": "Missing required field: refresh_token"}), 400
+
+    user_id = use_refresh_token(token)
+    if not user_id:
+        return jsonify({"message": "Invalid or expired refresh token"}), 401
+
+    user = db.users.find_one({"_id": user_id}, {"password": 0})
+    if not user or not user.get("is_verified", False):
+        return jsonify({"message": "Account is no longer active"}), 401
+
+    tokens = issue_tokens(user)
+    return jsonify({"message": "Token refreshed", "token": tokens["access_token"], **tokens, "role": user['role']}), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    data = request.get_json(silent=True) or {}
+    if data.get("refresh_token"):
+        revoke_refresh_token(data["refresh_token"])
+
+    # also cut off the access token presented with the request, if any
+    auth_header = request.headers.get('Authorization')
+    if auth_header and " " in auth_header:
+        try:
+            claims = jwt.decode(auth_header.split(" ")[1], SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            revoke_access_token(claims)
+        except jwt.InvalidTokenError:
+            pass
+
+    return jsonify({"message": "Logged out"}), 200
+
     # Generate secure reset token
 def generate_reset_token():
     return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
@@ -239,11 +293,15 @@ def reset_password():
         return jsonify({"message": "Reset link expired"}), 400
 
     # Update password
-    hashed = hash_password(new_password)
+    hashed = hashing.hash_password(new_password)
     db.users.update_one(
         {"email": email},
         {"$set": {"password": hashed, "updated_at": datetime.datetime.utcnow()}}
     )
+    principal_cache.invalidate(email=email)
+    user = db.users.find_one({"email": email}, {"_id": 1})
+    if user:
+        revoke_user(user["_id"])
 
     # Delete token after use
     db.password_resets.delete_one({"email": email})
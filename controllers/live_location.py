@@ -1,7 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from db import db
 from bson import ObjectId
 from utils.decorators import token_required
+from utils.locations import record_fix, record_fixes, ingest_queue
+from utils.live_cache import live_cache
+from utils.broker import broker
+from utils.history import iter_history
+from utils.track import simplify_stream
+from utils.eta import eta_engine
+from utils.geo_index import haversine
+from utils.streaming import stream_response, STREAM_FORMATS
+from config import (LIVE_STREAM_HEARTBEAT, LOCATION_BATCH_MAX, INGEST_MODE, TRACK_MAX_DAYS, TRACK_DEFAULT_TOLERANCE,
+                    NEARBY_BACKEND, NEARBY_MAX_RADIUS)
 import datetime
 
 live_bp = Blueprint('live', __name__)
@@ -15,6 +25,9 @@ def post_location(current_user):
     longitude = data.get("longitude")
     if not all([latitude, longitude, busId]):
         return jsonify({"message": "Missing required fields"}), 400
+    latitude, longitude = _as_number(latitude), _as_number(longitude)
+    if not _is_coordinate(latitude, 90) or not _is_coordinate(longitude, 180):
+        return jsonify({"message": "Invalid coordinates"}), 400
     try:
         bus = db.buses.find_one({"_id": ObjectId(busId)})
         if not bus:
@@ -28,19 +41,238 @@ def post_location(current_user):
         "longitude": longitude,
         "timestamp": datetime.datetime.utcnow()
     }
-    db.live_locations.insert_one(location)
+    if not record_fix(location, route=bus.get("route")):
+        return _ingest_busy()
+    if INGEST_MODE == "async":
+        return jsonify({"message": "Location accepted"}), 202
     return jsonify({"message": "Location updated successfully"}), 200
 
+def _ingest_busy():
+    response = jsonify({"message": "Location ingest is busy, retry shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+def _parse_timestamp(value):
+    # ISO 8601 string or epoch seconds/milliseconds -> naive UTC datetime
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.datetime.utcfromtimestamp(seconds)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            return _parse_timestamp(float(value))
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return parsed
+    return None
+
+def _is_coordinate(value, limit):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and -limit <= value <= limit
+
+def _as_number(value):
+    # older clients send coordinates as numeric strings
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return value
+
+@live_bp.route('/driver/locations/batch', methods=['POST'])
+@token_required(roles=['driver'])
+def post_locations_batch(current_user):
+    data = request.get_json() or {}
+    busId = data.get("busId")
+    fixes = data.get("fixes")
+    if not busId or not isinstance(fixes, list) or not fixes:
+        return jsonify({"message": "busId and a non-empty fixes list are required"}), 400
+    if len(fixes) > LOCATION_BATCH_MAX:
+        return jsonify({"message": f"At most {LOCATION_BATCH_MAX} fixes per batch"}), 413
+    try:
+        bus = db.buses.find_one({"_id": ObjectId(busId)})
+        if not bus:
+            return jsonify({"message": "Bus not found"}), 404
+    except:
+        return jsonify({"message": "Invalid bus ID format"}), 400
+
+    now = datetime.datetime.utcnow()
+    max_timestamp = now + datetime.timedelta(minutes=1)
+    locations, indexes, errors = [], [], []
+    for i, fix in enumerate(fixes):
+        if not isinstance(fix, dict):
+            errors.append({"index": i, "message": "Fix must be an object"})
+            continue
+        latitude = fix.get("latitude")
+        longitude = fix.get("longitude")
+        timestamp = _parse_timestamp(fix.get("timestamp"))
+        if not _is_coordinate(latitude, 90) or not _is_coordinate(longitude, 180):
+            errors.append({"index": i, "message": "Invalid coordinates"})
+        elif timestamp is None:
+            errors.append({"index": i, "message": "Invalid or missing timestamp"})
+        elif timestamp > max_timestamp:
+            errors.append({"index": i, "message": "Timestamp is in the future"})
+        else:
+            locations.append({
+                "driverId": ObjectId(current_user["_id"]),
+                "busId": bus["_id"],
+                "latitude": latitude,
+                "longitude": longitude,
+                "timestamp": timestamp
+            })
+            indexes.append(i)
+
+    written, failed = record_fixes(locations, route=bus.get("route"))
+    if locations and not written and INGEST_MODE == "async":
+        return _ingest_busy()
+    for j in failed:
+        errors.append({"index": indexes[j], "message": "Ingest queue full" if INGEST_MODE == "async" else "Write failed"})
+    errors.sort(key=lambda e: e["index"])
+    status = 200 if written else 400
+    return jsonify({
+        "message": f"{written} of {len(fixes)} fixes accepted",
+        "accepted": written,
+        "rejected": len(fixes) - written,
+        "errors": errors
+    }), status
+
+@live_bp.route('/admin/ingest/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_ingest_stats(current_user):
+    return jsonify({"mode": INGEST_MODE, **ingest_queue.stats()}), 200
+
 @live_bp.route('/locations', methods=['GET'])
 @token_required(roles=['student', 'admin', 'driver'])
 def get_locations(current_user):
-    latest_locations = []
-    buses = list(db.buses.find())
-    for bus in buses:
-        latest_location = db.live_locations.find_one({"busId": ObjectId(bus["_id"])}, sort=[("timestamp", -1)])
-        if latest_location:
-            latest_location["_id"] = str(latest_location["_id"])
-            latest_location["driverId"] = str(latest_location["driverId"])
-            latest_location["busId"] = str(latest_location["busId"])
-            latest_locations.append(latest_location)
-    return jsonify(latest_locations), 200
+    since_version = request.args.get('since_version', type=int)
+    if since_version is not None:
+        version, moved, removed = live_cache.changes_since(since_version)
+        if not moved and not removed:
+            response = current_app.response_class(status=304)
+        else:
+            body = live_cache.dumps({"version": version, "locations": moved, "removed": removed})
+            response = current_app.response_class(body, mimetype="application/json")
+        response.headers["X-Locations-Version"] = str(version)
+        return response
+
+    version, etag, body = live_cache.snapshot()
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["X-Locations-Version"] = str(version)
+    return response.make_conditional(request)
+
+@live_bp.route('/locations/nearby', methods=['GET'])
+@token_required(roles=['student', 'admin', 'driver'])
+def get_nearby_locations(current_user):
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    radius = request.args.get('radius', default=2000, type=float)
+    limit = request.args.get('limit', default=3, type=int)
+    if not _is_coordinate(latitude, 90) or not _is_coordinate(longitude, 180):
+        return jsonify({"message": "Valid lat and lon are required"}), 400
+    if not 0 < radius <= NEARBY_MAX_RADIUS or not 0 < limit <= 50:
+        return jsonify({"message": f"radius must be in (0, {NEARBY_MAX_RADIUS:g}] meters and limit in [1, 50]"}), 400
+
+    if NEARBY_BACKEND == "memory":
+        nearby = live_cache.nearby(latitude, longitude, radius, limit)
+    else:
+        docs = db.bus_latest_location.find({"geo": {"$nearSphere": {
+            "$geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+            "$maxDistance": radius
+        }}}, {"geo": 0}).limit(limit)
+        nearby = [(haversine(latitude, longitude, d["latitude"], d["longitude"]), d) for d in docs]
+
+    results = [{**position, "distance_m": round(distance, 1)} for distance, position in nearby]
+    return jsonify(results), 200
+
+@live_bp.route('/locations/stream', methods=['GET'])
+@token_required(roles=['student', 'admin', 'driver'], allow_query_token=True)
+def stream_locations(current_user):
+    # Server-Sent Events: current snapshot first, then every new fix as it is recorded
+    bus_ids = [b for b in request.args.get('bus', '').split(',') if b]
+    routes = [r for r in request.args.get('route', '').split(',') if r]
+    snapshot_ids = set(bus_ids)
+    if routes:
+        snapshot_ids.update(str(b["_id"]) for b in db.buses.find({"route": {"$in": routes}}, {"_id": 1}))
+
+    def events():
+        # subscribe inside the generator: a response closed before its first chunk never runs the finally
+        subscription = broker.subscribe(bus_ids, routes)
+        try:
+            yield "retry: 3000\n\n"
+            for location in live_cache.positions():
+                if not (bus_ids or routes) or location["busId"] in snapshot_ids:
+                    yield f"event: location\ndata: {live_cache.dumps(location).decode('utf-8')}\n\n"
+            while True:
+                message = subscription.get(timeout=LIVE_STREAM_HEARTBEAT)
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: location\ndata: {message['data']}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = current_app.response_class(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@live_bp.route('/buses/<bus_id>/track', methods=['GET'])
+@token_required(roles=['admin'])
+def get_bus_track(current_user, bus_id):
+    try:
+        bus_oid = ObjectId(bus_id)
+    except:
+        return jsonify({"message": "Invalid bus ID format"}), 400
+    start = _parse_timestamp(request.args.get('from'))
+    if start is None:
+        return jsonify({"message": "A valid 'from' timestamp is required"}), 400
+    try:
+        end = _parse_timestamp(request.args.get('to')) if request.args.get('to') else start + datetime.timedelta(days=1)
+    except OverflowError:
+        end = None
+    if end is None or end <= start:
+        return jsonify({"message": "'to' must be a valid timestamp after 'from'"}), 400
+    if end - start > datetime.timedelta(days=TRACK_MAX_DAYS):
+        return jsonify({"message": f"Range must be at most {TRACK_MAX_DAYS} days"}), 400
+    tolerance = request.args.get('tolerance', default=TRACK_DEFAULT_TOLERANCE, type=float)
+    output = request.args.get('format', 'ndjson')
+    if output not in STREAM_FORMATS:
+        return jsonify({"message": "format must be 'ndjson' or 'json'"}), 400
+
+    points = simplify_stream(iter_history(bus_oid, start, end), tolerance)
+    docs = ({"timestamp": t, "latitude": lat, "longitude": lon} for t, lat, lon in points)
+    return stream_response(docs, output)
+
+@live_bp.route('/buses/<bus_id>/eta', methods=['GET'])
+@token_required(roles=['student', 'admin', 'driver'])
+def get_bus_eta(current_user, bus_id):
+    try:
+        ObjectId(bus_id)
+    except:
+        return jsonify({"message": "Invalid bus ID format"}), 400
+    result = eta_engine.eta_for_bus(bus_id)
+    if result is None:
+        return jsonify({"message": "No live position or scheduled route for this bus"}), 404
+    return jsonify(result), 200
+
+@live_bp.route('/stops/<stop_id>/arrivals', methods=['GET'])
+@token_required(roles=['student', 'admin', 'driver'])
+def get_stop_arrivals(current_user, stop_id):
+    try:
+        ObjectId(stop_id)
+    except:
+        return jsonify({"message": "Invalid stop ID format"}), 400
+    stop, arrivals = eta_engine.arrivals_for_stop(stop_id)
+    if stop is None:
+        return jsonify({"message": "Stop not found"}), 404
+    return jsonify({"stopId": stop_id, "name": stop.get("name"), "arrivals": arrivals}), 200
@@ -0,0 +1,14 @@
+import hmac
+from flask import Blueprint, request, jsonify, Response
+from config import METRICS_TOKEN
+from utils.metrics import render
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Prometheus scrape target; only registered when METRICS_TOKEN is set, and always requires it
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    supplied = request.headers.get('Authorization', '')
+    if not METRICS_TOKEN or not hmac.compare_digest(supplied.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return jsonify({"message": "Unauthorized"}), 401
+    return Response(render(), mimetype="text/plain; version=0.0.4")
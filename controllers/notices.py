@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
-from db import db
+from db import db, db_reads
 from bson import ObjectId
 from utils.decorators import token_required
+from utils.pagination import keyset_page, page_limit, cached_count
 import datetime
 
 notices_bp = Blueprint('notices', __name__)
@@ -27,21 +28,29 @@ def create_notice(current_user):
 @notices_bp.route('/notices', methods=['GET'])
 @token_required(roles=['student', 'admin', 'driver'])
 def list_notices(current_user):
-    page = request.args.get('page', default=1, type=int)
-    limit = request.args.get('limit', default=10, type=int)
-    start = (page - 1) * limit
-    notices = list(db.academic_notices.find().sort([("createdAt", -1)]).skip(start).limit(limit))
-    total_notices = db.academic_notices.count_documents({})
-    for n in notices:
-        n["_id"] = str(n["_id"])
-        n["adminId"] = str(n["adminId"])
-    return jsonify({
+    limit = page_limit(default=10)
+    page = max(request.args.get('page', default=1, type=int), 1)
+    after = request.args.get('after')
+    next_cursor = None
+    if page > 1 and not after:
+        # legacy page numbers; ?after= cursors avoid the growing skip
+        notices = list(db_reads.academic_notices.find().sort([("createdAt", -1), ("_id", -1)]).skip((page - 1) * limit).limit(limit))
+    else:
+        try:
+            notices, next_cursor = keyset_page(db.academic_notices, limit=limit)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+    total_notices = cached_count(db.academic_notices, {})
+    result = {
         "notices": notices,
-        "page": page,
         "limit": limit,
         "total": total_notices,
-        "pages": (total_notices + limit - 1) // limit
-    }), 200
+        "pages": (total_notices + limit - 1) // limit,
+        "next_cursor": next_cursor
+    }
+    if not after:
+        result["page"] = page
+    return jsonify(result), 200
 
 @notices_bp.route('/admin/notices/<notice_id>', methods=['GET'])
 @token_required(roles=['admin'])
@@ -52,8 +61,6 @@ def get_notice(current_user, notice_id):
         return jsonify({"message": "Invalid notice ID format"}), 400
     if not notice:
         return jsonify({"message": "Notice not found"}), 404
-    notice["_id"] = str(notice["_id"])
-    notice["adminId"] = str(notice["adminId"])
     return jsonify(notice), 200
 
 @notices_bp.route('/admin/notices/<notice_id>', methods=['PUT'])
@@ -2,29 +2,50 @@ from flask import Blueprint, request, jsonify
 from db import db
 from bson import ObjectId
 from utils.decorators import token_required
+from utils.principal_cache import principal_cache
+from utils.tokens import revoke_user
+from utils.pagination import keyset_page, projection_for, cached_count, wants_total, page_response
+from utils.streaming import stream_response, STREAM_FORMATS
 import datetime
 
 student_bp = Blueprint('student', __name__)
 
+# Fields a list request may select with ?fields=
+BLOOD_REQUEST_FIELDS = ("userId", "bloodType", "quantity", "hospital", "contactName", "contactPhone", "description", "createdAt", "status")
+HOUSING_POST_FIELDS = ("userId", "title", "description", "address", "rent", "bedrooms", "bathrooms", "amenities", "contactName", "contactPhone", "createdAt")
+TUTORING_POST_FIELDS = ("userId", "title", "subject", "description", "hourlyRate", "availability", "contactName", "contactPhone", "createdAt")
+STUDENT_FIELDS = ("name", "email", "mobile", "role", "is_verified", "student_info", "created_at", "updated_at", "email_verified_at")
+# never returned by student views
+STUDENT_PRIVATE_FIELDS = ("password", "otp", "otp_expiry")
+
 # Student admin views
 @student_bp.route('/students', methods=['GET'])
 @token_required(roles=['admin'])
 def list_students(current_user):
-    students = list(db.users.find({"role": "student"}))
-    for s in students:
-        s["_id"] = str(s["_id"])
-    return jsonify(students), 200
+    query = {"role": "student"}
+    projection = projection_for(STUDENT_FIELDS, exclude=STUDENT_PRIVATE_FIELDS)
+    export = request.args.get('export')
+    if export:
+        if export not in STREAM_FORMATS:
+            return jsonify({"message": "export must be 'json' or 'ndjson'"}), 400
+        cursor = db.users.find(query, projection).sort([("created_at", -1), ("_id", -1)])
+        return stream_response(cursor.batch_size(1000), export)
+    try:
+        students, next_cursor = keyset_page(db.users, query, sort_field="created_at", projection=projection)
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.users, query) if wants_total() else None
+    return page_response(students, next_cursor, total)
 
 @student_bp.route('/students/<student_id>', methods=['GET'])
 @token_required(roles=['admin'])
 def get_student(current_user, student_id):
     try:
-        student = db.users.find_one({"_id": ObjectId(student_id), "role": "student"})
+        student = db.users.find_one({"_id": ObjectId(student_id), "role": "student"}, {f: 0 for f in STUDENT_PRIVATE_FIELDS})
     except:
         return jsonify({"message": "Invalid student ID format"}), 400
     if not student:
         return jsonify({"message": "Student not found"}), 404
-    student["_id"] = str(student["_id"])
     return jsonify(student), 200
 
 @student_bp.route('/students/<student_id>/activate', methods=['PUT'])
@@ -37,6 +58,7 @@ def activate_student(current_user, student_id):
     if not student:
         return jsonify({"message": "Student not found"}), 404
     db.users.update_one({"_id": ObjectId(student_id)}, {"$set": {"is_verified": True}})
+    principal_cache.invalidate(email=student.get("email"))
     return jsonify({"message": f"Student {student_id} activated successfully"}), 200
 
 @student_bp.route('/students/<student_id>/deactivate', methods=['PUT'])
@@ -49,6 +71,8 @@ def deactivate_student(current_user, student_id):
     if not student:
         return jsonify({"message": "Student not found"}), 404
     db.users.update_one({"_id": ObjectId(student_id)}, {"$set": {"is_verified": False}})
+    principal_cache.invalidate(email=student.get("email"))
+    revoke_user(student["_id"])
     return jsonify({"message": f"Student {student_id} deactivated successfully"}), 200
 
 @student_bp.route('/students/<student_id>/subscription', methods=['GET'])
@@ -87,20 +111,24 @@ def create_blood_request(current_user):
 @student_bp.route('/blood_requests/me', methods=['GET'])
 @token_required(roles=['student'])
 def get_my_blood_requests(current_user):
-    docs = list(db.blood_requests.find({"userId": ObjectId(current_user["_id"])}))
-    for d in docs:
-        d["_id"] = str(d["_id"])
-        d["userId"] = str(d["userId"])
-    return jsonify(docs), 200
+    query = {"userId": ObjectId(current_user["_id"])}
+    try:
+        docs, next_cursor = keyset_page(db.blood_requests, query, projection=projection_for(BLOOD_REQUEST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.blood_requests, query) if wants_total() else None
+    return page_response(docs, next_cursor, total)
 
 @student_bp.route('/blood_requests', methods=['GET'])
 @token_required(roles=['student'])
 def get_all_blood_requests(current_user):
-    docs = list(db.blood_requests.find())
-    for d in docs:
-        d["_id"] = str(d["_id"])
-        d["userId"] = str(d["userId"])
-    return jsonify(docs), 200
+    query = {}
+    try:
+        docs, next_cursor = keyset_page(db.blood_requests, query, projection=projection_for(BLOOD_REQUEST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.blood_requests, query) if wants_total() else None
+    return page_response(docs, next_cursor, total)
 
 # Housing posts
 @student_bp.route('/housing_posts', methods=['POST'])
@@ -129,11 +157,13 @@ def create_housing_post(current_user):
 @student_bp.route('/housing_posts/me', methods=['GET'])
 @token_required(roles=['student'])
 def get_my_housing_posts(current_user):
-    posts = list(db.housing_posts.find({"userId": ObjectId(current_user["_id"])}))
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        p["userId"] = str(p["userId"])
-    return jsonify(posts), 200
+    query = {"userId": ObjectId(current_user["_id"])}
+    try:
+        posts, next_cursor = keyset_page(db.housing_posts, query, projection=projection_for(HOUSING_POST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.housing_posts, query) if wants_total() else None
+    return page_response(posts, next_cursor, total)
 
 # Tutoring posts
 @student_bp.route('/tutoring_posts', methods=['POST'])
@@ -160,20 +190,24 @@ def create_tutoring_post(current_user):
 @student_bp.route('/tutoring_posts/me', methods=['GET'])
 @token_required(roles=['student'])
 def get_my_tutoring_posts(current_user):
-    posts = list(db.tutoring_posts.find({"userId": ObjectId(current_user["_id"])}))
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        p["userId"] = str(p["userId"])
-    return jsonify(posts), 200
+    query = {"userId": ObjectId(current_user["_id"])}
+    try:
+        posts, next_cursor = keyset_page(db.tutoring_posts, query, projection=projection_for(TUTORING_POST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.tutoring_posts, query) if wants_total() else None
+    return page_response(posts, next_cursor, total)
 
 @student_bp.route('/tutoring_posts', methods=['GET'])
 @token_required(roles=['student'])
 def get_all_tutoring_posts(current_user):
-    posts = list(db.tutoring_posts.find())
-    for p in posts:
-        p["_id"] = str(p["_id"])
-        p["userId"] = str(p["userId"])
-    return jsonify(posts), 200
+    query = {}
+    try:
+        posts, next_cursor = keyset_page(db.tutoring_posts, query, projection=projection_for(TUTORING_POST_FIELDS))
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
+    total = cached_count(db.tutoring_posts, query) if wants_total() else None
+    return page_response(posts, next_cursor, total)
 
 # Emergency contacts
 @student_bp.route('/student/emergency_contacts', methods=['PUT'])
@@ -188,6 +222,7 @@ def update_emergency_contacts(current_user):
             return jsonify({"message": "Missing required fields in emergency contact"}), 400
     try:
         db.users.update_one({"_id": ObjectId(current_user["_id"])}, {"$set": {"student_info.emergency_contacts": emergency_contacts}})
+        principal_cache.invalidate(email=current_user.get("email"))
         return jsonify({"message": "Emergency contacts updated successfully"}), 200
     except Exception as e:
         return jsonify({"message": "Error accessing database", "error": str(e)}), 500
@@ -1,15 +1,233 @@
 # db.py
-from pymongo import MongoClient
-import datetime
+import atexit
+import os
+import threading
+import time
+import pymongo
+from pymongo import monitoring
+from config import (MONGO_URI, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_CONNECT_TIMEOUT_MS,
+                    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, MONGO_READ_PREFERENCE,
+                    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_READS_URI, MONGO_READS_READ_PREFERENCE,
+                    MONGO_READS_MAX_STALENESS_SECONDS, MONGO_READS_MAX_POOL_SIZE, MONGO_WRITES_URI,
+                    MONGO_WRITES_W, MONGO_WRITES_JOURNAL, MONGO_WRITES_MAX_POOL_SIZE)
 
-# DIRECT CONNECTION — NO config needed!
-client = MongoClient("mongodb://localhost:27017/")
-db = client["bus_app"]  # Your database name
+# Indexes are declared in utils/indexes.py and created on each process's first connection
+# (create_app registers the hook) or by `flask ensure-indexes`
 
-# Auto-delete expired OTPs after 15 minutes
-db.pending_users.create_index(
-    "otp_expiry", 
-    expireAfterSeconds=0
-)
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connection checkouts and how long threads waited for one.
 
-print("MongoDB Connected Successfully!")
\ No newline at end of file
+    Checkout events fire on the thread doing the checkout, so the start
+    time is kept in a thread-local until the matching checked-out event.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+            self.in_use = 0
+            self.connections = 0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "in_use": self.in_use,
+                "connections": self.connections,
+            }
+
+class Database:
+    """A database handle, connected lazily and separately in every process.
+
+    Importing this module opens no connection. The MongoClient is created on
+    first use, and again in a forked worker, since a client must not be
+    shared across fork. Collections are reached as before: db.users,
+    db["users"]. Each handle has its own client, so its own connection pool
+    and pool metrics. Callbacks registered with on_connect run once per
+    process, before the first caller gets the database; child handles wait
+    for their parent's.
+    """
+
+    def __init__(self, label="main", uri=MONGO_URI, parent=None, **options):
+        self.label = label
+        self.uri = uri
+        self.name = MONGO_DB_NAME
+        self.parent = parent  # a handle whose injected client (and database name) this one shares
+        self.children = []
+        # without a separate MONGO_READS_URI / MONGO_WRITES_URI a child follows the parent's URI
+        self.follows_parent_uri = parent is not None and uri == parent.uri
+        if parent is not None:
+            parent.children.append(self)
+        self.options = {
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+            "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "readPreference": MONGO_READ_PREFERENCE,
+            **options,
+        }
+        self.pool_metrics = PoolMetrics()
+        self._client = None
+        self._database = None
+        self._pid = None
+        self._injected = False
+        self._lock = threading.Lock()
+        self._on_connect = []
+        self._prepared = None
+        self._prepare_lock = threading.Lock()
+
+    def configure(self, uri=None, name=None, client=None, **options):
+        """Override settings before first use; pass client= to inject one (e.g. mongomock)."""
+        self.close()
+        self.uri = uri or self.uri
+        self.name = name or self.name
+        self.options.update(options)
+        self._client = client
+        self._injected = client is not None
+        self._database = client[self.name] if client is not None else None
+        self._pid = os.getpid() if client is not None else None
+        self._prepared = None
+        self._update_children()
+
+    def on_connect(self, callback):
+        """Run callback(database) once per process before the database is first used."""
+        if callback not in self._on_connect:
+            self._on_connect.append(callback)
+
+    def _prepare(self):
+        with self._prepare_lock:
+            if self._prepared == os.getpid():
+                return
+            for callback in self._on_connect:
+                callback(self._database)
+            self._prepared = os.getpid()
+
+    def init_app(self, app):
+        # app.config may override the environment, e.g. for a test database
+        for key, attr in (("MONGO_URI", "uri"), ("MONGO_DB_NAME", "name")):
+            if app.config.get(key):
+                setattr(self, attr, app.config[key])
+        self._update_children()
+        app.extensions.setdefault("db", {})[self.label] = self
+        for child in self.children:
+            app.extensions["db"][child.label] = child
+
+    def _update_children(self):
+        # reads and writes must land in the same database as everything else
+        for child in self.children:
+            uri = self.uri if child.follows_parent_uri else child.uri
+            if (child.name, child.uri) != (self.name, uri):
+                child.close()
+                child.name, child.uri = self.name, uri
+
+    @property
+    def client(self):
+        if self.parent is not None and self.parent._injected:
+            # tests inject one client; every handle then uses it
+            return self.parent.client
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    if not self._injected:
+                        # the parent's client (if any) belongs to the parent; just drop it
+                        self._client = pymongo.MongoClient(self.uri, event_listeners=[self.pool_metrics], **self.options)
+                        self.pool_metrics.reset()
+                        if self._pid is None:
+                            atexit.register(self.close)
+                    self._database = self._client[self.name]
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def database(self):
+        if self.parent is not None:
+            parent_database = self.parent.database
+            if self.parent._injected:
+                return parent_database
+        self.client
+        if self._prepared != os.getpid():
+            self._prepare()
+        return self._database
+
+    def close(self):
+        if self._client is not None and self._pid == os.getpid() and not self._injected:
+            self._client.close()
+        self._client = None
+        self._database = None
+        self._pid = None
+        self._prepared = None
+
+    def stats(self):
+        return {"connected": self._client is not None and self._pid == os.getpid(),
+                "max_pool_size": self.options.get("maxPoolSize"),
+                "read_preference": self.options.get("readPreference"),
+                **self.pool_metrics.stats()}
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name in ("client", "database"):
+            raise AttributeError(name)
+        return getattr(self.database, name)
+
+    def __getitem__(self, name):
+        return self.database[name]
+
+
+def _reads_options():
+    options = {"maxPoolSize": MONGO_READS_MAX_POOL_SIZE, "readPreference": MONGO_READS_READ_PREFERENCE}
+    if MONGO_READS_READ_PREFERENCE != "primary" and MONGO_READS_MAX_STALENESS_SECONDS > 0:
+        options["maxStalenessSeconds"] = MONGO_READS_MAX_STALENESS_SECONDS
+    return options
+
+# db: everything by default. db_reads: list/read-heavy endpoints that can
+# tolerate bounded staleness. db_writes: location telemetry writes.
+db = Database()
+db_reads = Database("reads", MONGO_READS_URI, parent=db, **_reads_options())
+db_writes = Database("writes", MONGO_WRITES_URI, parent=db, maxPoolSize=MONGO_WRITES_MAX_POOL_SIZE,
+                     w=MONGO_WRITES_W, journal=MONGO_WRITES_JOURNAL)
+HANDLES = (db, db_reads, db_writes)
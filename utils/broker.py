@@ -0,0 +1,138 @@
+import json
+import os
+import queue
+import threading
+import time
+from config import LIVE_BROKER_BACKEND, REDIS_URL, LIVE_STREAM_QUEUE_SIZE
+
+class MemoryBackend:
+    """Delivers published messages to subscribers of this process only."""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, message):
+        self._deliver(message)
+
+class RedisBackend:
+    """Shares published messages between workers through a Redis channel."""
+
+    def __init__(self, url=REDIS_URL, channel="bus_app:locations"):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def start(self, deliver, max_backoff=30):
+        def listen():
+            # resubscribe after a dropped connection instead of losing fan-out for good
+            backoff = 1
+            while True:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                try:
+                    pubsub.subscribe(self.channel)
+                    backoff = 1
+                    for item in pubsub.listen():
+                        try:
+                            deliver(json.loads(item["data"]))
+                        except Exception as e:
+                            print(f"BROKER ERROR: {e}")
+                except Exception as e:
+                    print(f"BROKER CONNECTION ERROR: {e}; reconnecting in {backoff}s")
+                finally:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+                time.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+
+        threading.Thread(target=listen, name="location-broker", daemon=True).start()
+
+    def publish(self, message):
+        self._redis.publish(self.channel, json.dumps(message))
+
+class Subscription:
+    def __init__(self, bus_ids=None, routes=None, maxsize=LIVE_STREAM_QUEUE_SIZE):
+        self.bus_ids = set(bus_ids) if bus_ids else None
+        self.routes = set(routes) if routes else None
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def matches(self, message):
+        if self.bus_ids is None and self.routes is None:
+            return True
+        if self.bus_ids and message["busId"] in self.bus_ids:
+            return True
+        return bool(self.routes) and message.get("route") in self.routes
+
+    def put(self, message):
+        # a slow client only needs the newest positions, so drop the oldest
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class LocationBroker:
+    """Fans out each new fix to every matching live stream subscriber."""
+
+    def __init__(self, backend_factory):
+        self._backend_factory = backend_factory
+        self._backend = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def _get_backend(self):
+        # started lazily so each forked worker gets its own listener
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    backend = self._backend_factory()
+                    backend.start(self._deliver)
+                    self._backend = backend
+                    self._pid = os.getpid()
+        return self._backend
+
+    def subscribe(self, bus_ids=None, routes=None):
+        subscription = Subscription(bus_ids, routes)
+        self._get_backend()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, bus_id, data, route=None):
+        """Publish one serialized location (`data` is a JSON string)."""
+        self._get_backend().publish({"busId": str(bus_id), "route": route, "data": data})
+
+    def _deliver(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.matches(message):
+                subscription.put(message)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "redis": RedisBackend,
+}
+
+broker = LocationBroker(BACKENDS[LIVE_BROKER_BACKEND])
@@ -4,8 +4,11 @@ import jwt
 from config import SECRET_KEY, JWT_ALGORITHM
 from db import db
 from bson import ObjectId
+from utils.principal_cache import principal_cache
+from utils.tokens import revocations, principal_from_claims
 
-def token_required(roles=None):
+def token_required(roles=None, allow_query_token=False):
+    # allow_query_token: also accept ?token= (EventSource clients cannot set headers)
     if roles is None:
         roles = []
 
@@ -16,13 +19,27 @@ def token_required(roles=None):
             auth_header = request.headers.get('Authorization')
             if auth_header and " " in auth_header:
                 token = auth_header.split(" ")[1]
+            elif allow_query_token:
+                token = request.args.get('token')
 
             if not token:
                 return jsonify({'message': 'Token is missing!'}), 401
 
             try:
                 data = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-                current_user = db.users.find_one({'email': data.get('email')})
+                if data.get('type') == 'access':
+                    # everything needed is in the claims; no database read
+                    if revocations.is_revoked(data):
+                        return jsonify({'message': 'Token has been revoked'}), 401
+                    current_user = principal_from_claims(data)
+                else:
+                    # legacy 24h tokens (email + role only) minted before refresh tokens
+                    email = data.get('email')
+                    current_user = principal_cache.get(email)
+                    if current_user is None:
+                        current_user = db.users.find_one({'email': email}, {'password': 0})
+                        if current_user:
+                            principal_cache.put(email, current_user)
                 if not current_user:
                     return jsonify({'message': 'Invalid Token!'}), 401
 
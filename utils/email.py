@@ -1,56 +1,150 @@
-import resend
-from config import RESEND_API_KEY, APP_NAME
-
-# Set API key
-resend.api_key ="9f8e6d5c4b3a291807f6e5d4c3b2a1908f7e6d5c4b3a291807f6e5d4c3b2a190"
-
-print("RESEND v0.8.0 CONNECTED — EMAILS READY!")
-
-def send_email(to_email, subject, html_body):
-    try:
-        resend.emails.send({
-            "from": f"sub_bus <no-reply@resend.dev>",
-            "to": to_email,
-            "subject": subject,
-            "html": html_body
-        })
-        print(f"EMAIL SENT TO {to_email}")
+import os
+import re
+import threading
+from markupsafe import Markup, escape
+from config import APP_NAME, EMAIL_BACKEND, EMAIL_OUTBOX, EMAIL_TEMPLATE_DIR, EMAIL_DEFAULT_LOCALE
+from utils.email_backends import get_backend
+from utils.outbox import outbox
+
+def send_email(to_email, subject, html_body, text_body=None):
+    # With EMAIL_OUTBOX the message is queued and sent by the outbox workers
+    if EMAIL_OUTBOX:
+        outbox.enqueue(to_email, subject, html_body, text_body)
         return True
-    except Exception as e:
-        print(f"RESEND ERROR: {e}")
+    error = get_backend(EMAIL_BACKEND).send_batch([{"to": to_email, "subject": subject, "html": html_body, "text": text_body}])[0]
+    if error:
+        print(f"EMAIL ERROR: {error}")
         return False
+    print(f"EMAIL SENT TO {to_email}")
+    return True
+
+
+# Email templates live in EMAIL_TEMPLATE_DIR as <name>.subject, <name>.html
+# and <name>.txt, with locale variants named <name>.<locale>.html etc.
+# {{ slot }} placeholders are filled at render time; constant slots such as
+# app_name are baked into the static text when the template is compiled.
+SLOT_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+TEMPLATE_CONSTANTS = {"app_name": APP_NAME}
+
+class CompiledTemplate:
+    def __init__(self, source, autoescape):
+        self.autoescape = autoescape
+        parts = []  # alternating static text and slot names: [text, slot, text, ...]
+        static = ""
+        pos = 0
+        for match in SLOT_RE.finditer(source):
+            static += source[pos:match.start()]
+            slot = match.group(1)
+            if slot in TEMPLATE_CONSTANTS:
+                value = TEMPLATE_CONSTANTS[slot]
+                static += str(escape(value) if autoescape else value)
+            else:
+                parts.append(static)
+                parts.append(slot)
+                static = ""
+            pos = match.end()
+        parts.append(static + source[pos:])
+        self.statics = parts[0::2]
+        self.slots = parts[1::2]
+
+    def render(self, context):
+        out = [self.statics[0]]
+        for slot, static in zip(self.slots, self.statics[1:]):
+            value = context.get(slot, "")
+            out.append(str(escape(value)) if self.autoescape else str(value))
+            out.append(static)
+        return "".join(out)
+
+class EmailTemplate:
+    def __init__(self, subject, html, text):
+        self.subject = subject
+        self.html = html
+        self.text = text
+
+    def render(self, **context):
+        """Returns (subject, html, text); text is None without a .txt part."""
+        subject = self.subject.render(context).strip() if self.subject else ""
+        html = self.html.render(context) if self.html else None
+        text = self.text.render(context) if self.text else None
+        return subject, html, text
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+def _load_part(name, locale, ext, autoescape):
+    for candidate in (f"{name}.{locale}.{ext}", f"{name}.{ext}"):
+        path = os.path.join(EMAIL_TEMPLATE_DIR, candidate)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return CompiledTemplate(f.read(), autoescape)
+    return None
+
+def get_template(name, locale=None):
+    """Loads and compiles a template once per (name, locale); falls back to the default locale."""
+    locale = locale or EMAIL_DEFAULT_LOCALE
+    key = (name, locale)
+    template = _templates.get(key)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(key)
+            if template is None:
+                template = EmailTemplate(
+                    _load_part(name, locale, "subject", False),
+                    _load_part(name, locale, "html", True),
+                    _load_part(name, locale, "txt", False),
+                )
+                if template.html is None and template.text is None:
+                    raise LookupError(f"Email template '{name}' not found in {EMAIL_TEMPLATE_DIR}")
+                _templates[key] = template
+    return template
+
+def send_template_email(to_email, template, locale=None, **context):
+    subject, html, text = get_template(template, locale).render(**context)
+    return send_email(to_email, subject, html, text)
 
 
 # OTP EMAIL
-def send_otp_email(to_email, name, otp):
-    subject = f"[{APP_NAME}] Your OTP Code"
-    html = f"""
-    <div style="font-family: Arial; text-align: center; padding: 40px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; border-radius: 15px;">
-        <h1>Welcome {name}!</h1>
-        <p>Your verification code is:</p>
-        <h2 style="font-size: 48px; letter-spacing: 10px; background: white; color: #667eea; padding: 20px; border-radius: 15px; display: inline-block;">
-            {otp}
-        </h2>
-        <p><strong>Valid for 10 minutes</strong></p>
-    </div>
-    """
-    send_email(to_email, subject, html)
+def send_otp_email(to_email, name, otp, locale=None):
+    return send_template_email(to_email, "otp", locale, name=name, otp=otp)
 
 
 # RESET PASSWORD EMAIL
-def send_reset_email(to_email, name, reset_link):
-    subject = f"[{APP_NAME}] Reset Your Password"
-    html = f"""
-    <div style="font-family: Arial; max-width: 500px; margin: 40px auto; padding: 30px; border: 1px solid #ddd; border-radius: 15px; text-align: center; box-shadow: 0 10px 30px rgba(0,0,0,0.1);">
-        <h2 style="color: #667eea;">Password Reset</h2>
-        <p>Hello <strong>{name}</strong>,</p>
-        <p>Click below to reset:</p>
-        <a href="{reset_link}" style="background: #667eea; color: white; padding: 18px 40px; text-decoration: none; border-radius: 50px; font-size: 20px; font-weight: bold; display: inline-block; margin: 20px;">
-            RESET PASSWORD
-        </a>
-        <p><small>Expires in 15 minutes</small></p>
-        <hr>
-        <small>{APP_NAME} Team</small>
-    </div>
-    """
-    send_email(to_email, subject, html)
\ No newline at end of file
+def send_reset_email(to_email, name, reset_link, locale=None):
+    return send_template_email(to_email, "reset", locale, name=name, reset_link=reset_link)
+
+
+# NOTICE DIGEST (bulk)
+def send_notice_digest(recipients, notices, locale=None):
+    """Queues one digest per recipient ({"email", "name"}); the notice list is rendered once."""
+    item = get_template("notice_item", locale)
+    context = {"count": len(notices)}
+    html_items = []
+    text_items = []
+    for notice in notices:
+        created = notice.get("createdAt")
+        fields = {
+            "title": notice.get("title", ""),
+            "content": notice.get("content", ""),
+            "date": created.strftime("%d %b %Y") if created else "",
+        }
+        html_items.append(item.html.render(fields))
+        text_items.append(item.text.render(fields))
+    # Markup keeps the already escaped item HTML from being escaped twice
+    html_notices = Markup("".join(html_items))
+    text_notices = "".join(text_items)
+
+    digest = get_template("notice_digest", locale)
+    messages = []
+    for recipient in recipients:
+        context["name"] = recipient.get("name", "")
+        subject = digest.subject.render(context).strip()
+        context["notices"] = html_notices
+        html = digest.html.render(context)
+        context["notices"] = text_notices
+        text = digest.text.render(context)
+        messages.append({"to": recipient["email"], "subject": subject, "html": html, "text": text})
+    if EMAIL_OUTBOX:
+        outbox.enqueue_many(messages)
+    else:
+        get_backend(EMAIL_BACKEND).send_batch(messages)
+    return len(messages)
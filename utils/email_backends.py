@@ -0,0 +1,87 @@
+import json
+import smtplib
+import threading
+from email.message import EmailMessage
+from config import RESEND_API_KEY, EMAIL_FROM, EMAIL_FILE_PATH, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS
+
+# A message is a dict with "to", "subject", "html" and optionally "text".
+# send_batch() returns one error string (or None on success) per message.
+
+class ResendBackend:
+    def send_batch(self, messages):
+        import resend  # imported and configured on first send, not at startup
+        resend.api_key = RESEND_API_KEY
+        params = [self._params(m) for m in messages]
+        try:
+            if len(params) == 1:
+                resend.Emails.send(params[0])
+            else:
+                resend.Batch.send(params)
+            return [None] * len(messages)
+        except Exception as e:
+            return [str(e)] * len(messages)
+
+    @staticmethod
+    def _params(message):
+        params = {"from": EMAIL_FROM, "to": message["to"], "subject": message["subject"], "html": message["html"]}
+        if message.get("text"):
+            params["text"] = message["text"]
+        return params
+
+class SMTPBackend:
+    def send_batch(self, messages):
+        try:
+            with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+                smtp.starttls()
+                if SMTP_USER:
+                    smtp.login(SMTP_USER, SMTP_PASS)
+                errors = []
+                for message in messages:
+                    try:
+                        smtp.send_message(self._build(message))
+                        errors.append(None)
+                    except Exception as e:
+                        errors.append(str(e))
+                return errors
+        except Exception as e:
+            return [str(e)] * len(messages)
+
+    @staticmethod
+    def _build(message):
+        email = EmailMessage()
+        email["From"] = EMAIL_FROM
+        email["To"] = message["to"]
+        email["Subject"] = message["subject"]
+        email.set_content(message.get("text") or "This message requires an HTML capable email client.")
+        email.add_alternative(message["html"], subtype="html")
+        return email
+
+class FileBackend:
+    """Appends each message as a JSON line; for local development and tests."""
+
+    def __init__(self, path=EMAIL_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps({k: message.get(k) for k in ("to", "subject", "html", "text")}) + "\n")
+        return [None] * len(messages)
+
+class ConsoleBackend:
+    def send_batch(self, messages):
+        for message in messages:
+            print(f"EMAIL TO {message['to']}: {message['subject']}")
+        return [None] * len(messages)
+
+
+BACKENDS = {
+    "resend": ResendBackend,
+    "smtp": SMTPBackend,
+    "file": FileBackend,
+    "console": ConsoleBackend,
+}
+
+def get_backend(name):
+    return BACKENDS[name]()
@@ -0,0 +1,224 @@
+import datetime
+import math
+import threading
+import time
+from db import db_reads
+from config import ETA_DEFAULT_SPEED, ETA_MIN_SPEED, ETA_ROUTE_CACHE_TTL, SCHEDULE_UTC_OFFSET_MINUTES
+from utils.live_cache import live_cache
+from utils.geo_index import haversine
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def _minutes(hhmm):
+    try:
+        hours, minutes = str(hhmm).split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+def project_onto_route(lat, lon, stops, cumulative):
+    """Distance along the route (meters) of the point closest to (lat, lon)."""
+    if len(stops) == 1:
+        return 0.0
+    scale_x = math.cos(math.radians(lat))
+    best_along, best_distance = 0.0, None
+    for i in range(len(stops) - 1):
+        a, b = stops[i], stops[i + 1]
+        ax, ay = a["longitude"] * scale_x, a["latitude"]
+        bx, by = b["longitude"] * scale_x, b["latitude"]
+        px, py = lon * scale_x, lat
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+        distance = math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+        if best_distance is None or distance < best_distance:
+            best_distance = distance
+            best_along = cumulative[i] + t * (cumulative[i + 1] - cumulative[i])
+    return best_along
+
+class SpeedTracker:
+    """Exponentially weighted moving average of a bus's ground speed."""
+
+    def __init__(self, alpha=0.3, max_gap=600, max_speed=40.0):
+        self.alpha = alpha
+        self.max_gap = max_gap  # seconds; a longer silence restarts the estimate
+        self.max_speed = max_speed  # m/s; faster jumps are treated as GPS noise
+        self.last = None
+        self.speed = None
+
+    def update(self, timestamp, lat, lon):
+        if self.last is not None:
+            last_ts, last_lat, last_lon = self.last
+            elapsed = (timestamp - last_ts).total_seconds()
+            if elapsed <= 0:
+                return
+            if elapsed > self.max_gap:
+                self.speed = None
+            else:
+                speed = haversine(last_lat, last_lon, lat, lon) / elapsed
+                if speed > self.max_speed:
+                    return
+                self.speed = speed if self.speed is None else self.alpha * speed + (1 - self.alpha) * self.speed
+        self.last = (timestamp, lat, lon)
+
+class EtaEngine:
+    """Per-bus arrival estimates for the stops on each bus's scheduled route.
+
+    Speeds are updated from every recorded fix; a bus's ETAs are computed
+    once per new fix and served from cache until the next one arrives.
+    """
+
+    def __init__(self, route_ttl=ETA_ROUTE_CACHE_TTL):
+        self.route_ttl = route_ttl
+        self._lock = threading.Lock()
+        self._speeds = {}
+        self._etas = {}
+        self._routes = None
+        self._routes_loaded_at = 0.0
+
+    def on_fix(self, location):
+        bus_id = str(location["busId"])
+        with self._lock:
+            tracker = self._speeds.setdefault(bus_id, SpeedTracker())
+            tracker.update(location["timestamp"], location["latitude"], location["longitude"])
+            self._etas.pop(bus_id, None)
+
+    def invalidate_routes(self):
+        with self._lock:
+            self._routes = None
+            self._etas.clear()
+
+    def _load_routes(self):
+        # schedules with stops for every bus, plus the stop documents they reference
+        if self._routes is not None and time.monotonic() - self._routes_loaded_at < self.route_ttl:
+            return self._routes
+        schedules = list(db_reads.schedules.find({"stops.0": {"$exists": True}}))
+        stop_ids = {sid for s in schedules for sid in s["stops"]}
+        stops = {str(s["_id"]): s for s in db_reads.stops.find({"_id": {"$in": list(stop_ids)}})}
+        routes = {"by_bus": {}, "by_stop": {}, "stops": stops}
+        for schedule in schedules:
+            route_stops = [stops[str(sid)] for sid in schedule["stops"] if str(sid) in stops]
+            if not route_stops:
+                continue
+            cumulative = [0.0]
+            for a, b in zip(route_stops, route_stops[1:]):
+                cumulative.append(cumulative[-1] + haversine(a["latitude"], a["longitude"], b["latitude"], b["longitude"]))
+            entry = {"schedule": schedule, "stops": route_stops, "cumulative": cumulative}
+            bus_id = str(schedule["bus_id"])
+            routes["by_bus"].setdefault(bus_id, []).append(entry)
+            for stop in route_stops:
+                routes["by_stop"].setdefault(str(stop["_id"]), set()).add(bus_id)
+        with self._lock:
+            self._routes = routes
+            self._routes_loaded_at = time.monotonic()
+            self._etas.clear()
+        return routes
+
+    @staticmethod
+    def _active_route(entries, now):
+        local = now + datetime.timedelta(minutes=SCHEDULE_UTC_OFFSET_MINUTES)
+        today = [e for e in entries if WEEKDAYS[local.weekday()] in (e["schedule"].get("days_of_week") or [])] or entries
+        minute = local.hour * 60 + local.minute
+        running, upcoming = None, None
+        for entry in today:
+            departure = _minutes(entry["schedule"].get("departure_time"))
+            arrival = _minutes(entry["schedule"].get("arrival_time"))
+            if departure is None or arrival is None:
+                continue
+            if departure <= minute <= arrival:
+                running = entry
+                break
+            if departure > minute and (upcoming is None or departure < _minutes(upcoming["schedule"]["departure_time"])):
+                upcoming = entry
+        return running or upcoming or today[0]
+
+    @staticmethod
+    def _schedule_speed(entry):
+        departure = _minutes(entry["schedule"].get("departure_time"))
+        arrival = _minutes(entry["schedule"].get("arrival_time"))
+        if departure is None or arrival is None or arrival <= departure or entry["cumulative"][-1] == 0:
+            return None
+        return entry["cumulative"][-1] / ((arrival - departure) * 60)
+
+    def eta_for_bus(self, bus_id):
+        """Return the cached ETA result for a bus, or None if it has no position or route."""
+        bus_id = str(bus_id)
+        routes = self._load_routes()
+        entries = routes["by_bus"].get(bus_id)
+        position = live_cache.get(bus_id)
+        if not entries or position is None:
+            return None
+
+        with self._lock:
+            cached = self._etas.get(bus_id)
+            if cached is not None and cached["position"]["timestamp"] == position["timestamp"]:
+                return cached
+            tracker = self._speeds.setdefault(bus_id, SpeedTracker())
+            if tracker.last is None or tracker.last[0] < position["timestamp"]:
+                # fix recorded by another worker and picked up through the live cache
+                tracker.update(position["timestamp"], position["latitude"], position["longitude"])
+            live_speed = tracker.speed
+
+        entry = self._active_route(entries, position["timestamp"])
+        if live_speed is not None and live_speed >= ETA_MIN_SPEED:
+            speed, source = live_speed, "live"
+        elif self._schedule_speed(entry):
+            speed, source = self._schedule_speed(entry), "schedule"
+        else:
+            speed, source = ETA_DEFAULT_SPEED, "default"
+
+        along = project_onto_route(position["latitude"], position["longitude"], entry["stops"], entry["cumulative"])
+        upcoming = []
+        for stop, distance_at in zip(entry["stops"], entry["cumulative"]):
+            remaining = distance_at - along
+            if remaining < 0:
+                continue
+            seconds = remaining / speed
+            upcoming.append({
+                "stopId": str(stop["_id"]),
+                "name": stop.get("name"),
+                "distance_m": round(remaining, 1),
+                "eta_seconds": round(seconds),
+                "eta": position["timestamp"] + datetime.timedelta(seconds=seconds),
+            })
+
+        result = {
+            "busId": bus_id,
+            "scheduleId": str(entry["schedule"]["_id"]),
+            "route": entry["schedule"].get("route"),
+            "position": position,
+            "speed_mps": round(speed, 2),
+            "speed_source": source,
+            "stops": upcoming,
+        }
+        with self._lock:
+            self._etas[bus_id] = result
+        return result
+
+    def arrivals_for_stop(self, stop_id):
+        """Return (stop, arrivals) for a stop, soonest first; stop is None if unknown."""
+        routes = self._load_routes()
+        stop = routes["stops"].get(str(stop_id))
+        if stop is None:
+            return None, []
+        arrivals = []
+        for bus_id in routes["by_stop"].get(str(stop_id), ()):
+            result = self.eta_for_bus(bus_id)
+            if result is None:
+                continue
+            for upcoming in result["stops"]:
+                if upcoming["stopId"] == str(stop_id):
+                    arrivals.append({
+                        "busId": bus_id,
+                        "route": result["route"],
+                        "distance_m": upcoming["distance_m"],
+                        "eta_seconds": upcoming["eta_seconds"],
+                        "eta": upcoming["eta"],
+                        "speed_source": result["speed_source"],
+                    })
+                    break
+        arrivals.sort(key=lambda a: a["eta"])
+        return stop, arrivals
+
+
+eta_engine = EtaEngine()
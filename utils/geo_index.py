@@ -0,0 +1,84 @@
+import math
+import threading
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+def haversine(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def point(latitude, longitude):
+    # GeoJSON point as stored for 2dsphere indexes
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def _ring_cells(row, col, ring):
+    # cells on the perimeter of the square `ring` cells away from (row, col)
+    if ring == 0:
+        yield row, col
+        return
+    for c in range(col - ring, col + ring + 1):
+        yield row - ring, c
+        yield row + ring, c
+    for r in range(row - ring + 1, row + ring):
+        yield r, col - ring
+        yield r, col + ring
+
+class GridIndex:
+    """Uniform lat/lon grid over the latest bus positions for radius queries."""
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._points = {}
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def update(self, key, lat, lon):
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                self._discard(key, previous[2])
+            self._points[key] = (lat, lon, cell)
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is not None:
+                self._discard(key, previous[2])
+
+    def _discard(self, key, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def nearest(self, lat, lon, radius_m, limit):
+        """Return [(distance_m, key)] within radius_m, closest first, at most limit."""
+        row, col = self._cell(lat, lon)
+        # a cell's narrowest side, so ring r is guaranteed to cover r * step meters
+        step = self.cell_degrees * METERS_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + self.cell_degrees, 89.9))), 0.01)
+        max_ring = int(math.ceil(radius_m / step)) + 1
+        found = []
+        with self._lock:
+            for ring in range(max_ring + 1):
+                for cell in _ring_cells(row, col, ring):
+                    for key in self._cells.get(cell, ()):
+                        p_lat, p_lon, _ = self._points[key]
+                        distance = haversine(lat, lon, p_lat, p_lon)
+                        if distance <= radius_m:
+                            found.append((distance, key))
+                found.sort()
+                if len(found) >= limit and found[limit - 1][0] <= ring * step:
+                    break
+        return found[:limit]
+
+    def __len__(self):
+        return len(self._points)
@@ -0,0 +1,86 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import (PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_TIMEOUT,
+                    WEB_CONCURRENCY)
+from utils import helpers
+
+class HashingBusy(Exception):
+    """Raised when too many password operations are already waiting."""
+
+class HashingExecutor:
+    """Runs password hashing in a process pool so it never holds this worker's GIL.
+
+    At most `max_pending` operations may be queued or running per process;
+    beyond that callers get HashingBusy instead of waiting, so a login storm
+    is turned away early while the tracking endpoints keep their CPU.
+    With mode "inline" the functions simply run in the calling thread.
+    """
+
+    def __init__(self, mode=PASSWORD_HASH_EXECUTOR, workers=PASSWORD_HASH_WORKERS,
+                 max_pending=PASSWORD_HASH_MAX_PENDING, timeout=PASSWORD_HASH_TIMEOUT):
+        self.mode = mode
+        # every web worker has its own pool; together they should not exceed the cores
+        self.workers = workers or max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY))
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._counters = {"completed": 0, "rejected": 0, "timed_out": 0}
+
+    def _get_pool(self):
+        # a pool created before fork is unusable in the child; make one per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # spawn: forking a process that already runs flusher/outbox threads is unsafe
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                    if self._pid is None:
+                        atexit.register(self.shutdown)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _call(self, fn, *args):
+        if self.mode != "process":
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise HashingBusy()
+            self._pending += 1
+        try:
+            future = self._get_pool().submit(fn, *args)
+            try:
+                result = future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                with self._lock:
+                    self._counters["timed_out"] += 1
+                raise HashingBusy()
+            with self._lock:
+                self._counters["completed"] += 1
+            return result
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def hash_password(self, password):
+        return self._call(helpers.hash_password, password)
+
+    def verify_and_update(self, password, hashed):
+        return self._call(helpers.verify_and_update_password, password, hashed)
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {"mode": self.mode, "workers": self.workers, "pending": self._pending,
+                "max_pending": self.max_pending, **self._counters}
+
+
+hashing = HashingExecutor()
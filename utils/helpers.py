@@ -1,6 +1,12 @@
+import logging
 import secrets
 import datetime
-from passlib.hash import sha256_crypt
+from passlib.context import CryptContext
+from config import PASSWORD_SCHEMES, BCRYPT_ROUNDS, SHA256_CRYPT_ROUNDS
+
+# passlib 1.7.4 looks for bcrypt.__about__, which bcrypt >= 4.1 no longer ships, and logs
+# a harmless "(trapped) error reading bcrypt version" traceback in every process
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
 
 def generate_otp():
     return str(secrets.randbelow(1000000)).zfill(6)
@@ -10,8 +16,25 @@ def send_otp(mobile, otp):
     print(f"Sending OTP {otp} to {mobile}")
     return True
 
+def build_password_context(schemes=PASSWORD_SCHEMES, bcrypt_rounds=BCRYPT_ROUNDS, sha256_rounds=SHA256_CRYPT_ROUNDS):
+    # min_rounds = rounds, so raising the cost also marks older, cheaper hashes for upgrade
+    return CryptContext(
+        schemes=schemes,
+        deprecated=["auto"],
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        sha256_crypt__rounds=sha256_rounds,
+        sha256_crypt__min_rounds=sha256_rounds,
+    )
+
+pwd_context = build_password_context()
+
 def hash_password(password: str) -> str:
-    return sha256_crypt.hash(password)
+    return pwd_context.hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return sha256_crypt.verify(password, hashed)
+    return pwd_context.verify(password, hashed)
+
+def verify_and_update_password(password: str, hashed: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    return pwd_context.verify_and_update(password, hashed)
@@ -0,0 +1,100 @@
+import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from db import db_reads, db_writes
+from config import LOCATION_STORAGE, LOCATION_BUCKET_SECONDS
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def bucket_start(timestamp, bucket_seconds=LOCATION_BUCKET_SECONDS):
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + datetime.timedelta(seconds=seconds - seconds % bucket_seconds)
+
+def write_history(locations, storage=LOCATION_STORAGE):
+    """Store fixes in the configured history layout; returns indexes that failed."""
+    if storage == "buckets":
+        return write_buckets(locations)
+    try:
+        db_writes.live_locations.insert_many(locations, ordered=False)
+    except BulkWriteError as e:
+        return sorted(err["index"] for err in e.details.get("writeErrors", []))
+    return []
+
+def write_buckets(locations, migrating=False):
+    # One bucket per (bus, driver, window) holding parallel arrays:
+    # offsets (ms from bucket start), lat, lon
+    # migrating: fixes copied from live_locations in _id order; each bucket
+    # records the highest source _id merged so a re-run skips them
+    groups = {}
+    for i, loc in enumerate(locations):
+        start = bucket_start(loc["timestamp"])
+        key = (loc["busId"], loc["driverId"], start)
+        groups.setdefault(key, []).append(i)
+
+    requests, members = [], []
+    for (bus_id, driver_id, start), indexes in groups.items():
+        fixes = [locations[i] for i in indexes]
+        offsets = [int((f["timestamp"] - start).total_seconds() * 1000) for f in fixes]
+        query = {"busId": bus_id, "driverId": driver_id, "start": start}
+        update = {
+            "$push": {
+                "offsets": {"$each": offsets},
+                "lat": {"$each": [f["latitude"] for f in fixes]},
+                "lon": {"$each": [f["longitude"] for f in fixes]},
+            },
+            "$inc": {"count": len(fixes)},
+            "$min": {"first": min(f["timestamp"] for f in fixes)},
+            "$max": {"last": max(f["timestamp"] for f in fixes)},
+            "$setOnInsert": {"downsampled": False},
+        }
+        if migrating:
+            query["migrated_upto"] = {"$not": {"$gte": min(f["_id"] for f in fixes)}}
+            update["$max"]["migrated_upto"] = max(f["_id"] for f in fixes)
+        requests.append(UpdateOne(query, update, upsert=True))
+        members.append(indexes)
+    if not requests:
+        return []
+    try:
+        db_writes.live_location_buckets.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        failed = []
+        for err in e.details.get("writeErrors", []):
+            if migrating and err.get("code") == 11000:
+                continue  # the bucket already holds these fixes
+            failed.extend(members[err["index"]])
+        return sorted(failed)
+    return []
+
+def iter_history(bus_id, start, end, storage=LOCATION_STORAGE, batch_size=2000):
+    """Yield (timestamp, latitude, longitude) for a bus in time order, start <= t < end."""
+    if storage != "buckets":
+        cursor = db_reads.live_locations.find(
+            {"busId": bus_id, "timestamp": {"$gte": start, "$lt": end}},
+            {"_id": 0, "timestamp": 1, "latitude": 1, "longitude": 1}
+        ).sort("timestamp", 1).batch_size(batch_size)
+        for doc in cursor:
+            yield doc["timestamp"], doc["latitude"], doc["longitude"]
+        return
+
+    cursor = db_reads.live_location_buckets.find(
+        {"busId": bus_id, "start": {"$gte": bucket_start(start), "$lt": end}},
+        {"_id": 0, "start": 1, "offsets": 1, "lat": 1, "lon": 1}
+    ).sort("start", 1)
+    # buckets of one window (several drivers) are merged before yielding
+    window, points = None, []
+    for bucket in cursor:
+        if bucket["start"] != window:
+            yield from _window_points(points, start, end)
+            window, points = bucket["start"], []
+        base = bucket["start"]
+        points.extend(
+            (base + datetime.timedelta(milliseconds=offset), lat, lon)
+            for offset, lat, lon in zip(bucket["offsets"], bucket["lat"], bucket["lon"])
+        )
+    yield from _window_points(points, start, end)
+
+def _window_points(points, start, end):
+    points.sort(key=lambda p: p[0])
+    for point in points:
+        if start <= point[0] < end:
+            yield point
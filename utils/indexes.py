@@ -0,0 +1,156 @@
+import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
+from db import db
+
+# Every index the app relies on: (collection, keys, options)
+INDEXES = [
+    # auth
+    ("users", [("email", ASCENDING)], {"unique": True}),
+    ("users", [("role", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    ("pending_users", [("email", ASCENDING)], {"unique": True}),
+    ("pending_users", [("otp_expiry", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("password_resets", [("email", ASCENDING), ("token", ASCENDING)], {}),
+    ("password_resets", [("expiry", ASCENDING)], {"expireAfterSeconds": 0}),
+    # refresh tokens and the access token denylist; both expire on their own
+    ("refresh_tokens", [("token_hash", ASCENDING)], {"unique": True}),
+    ("refresh_tokens", [("user_id", ASCENDING)], {}),
+    ("refresh_tokens", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("token_revocations", [("key", ASCENDING)], {"unique": True}),
+    ("token_revocations", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    # email outbox: due messages, and sent ones expire after a week
+    ("email_outbox", [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+    ("email_outbox", [("sent_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    # student posts
+    # keyset pagination: newest first by (createdAt, _id), optionally per author
+    ("blood_requests", [("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    ("blood_requests", [("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    ("housing_posts", [("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    ("housing_posts", [("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    ("tutoring_posts", [("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    ("tutoring_posts", [("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    ("academic_notices", [("createdAt", DESCENDING), ("_id", DESCENDING)], {}),
+    # live tracking
+    ("live_locations", [("busId", ASCENDING), ("timestamp", DESCENDING)], {}),
+    ("live_locations", [("timestamp", ASCENDING)], {}),
+    ("bus_latest_location", [("busId", ASCENDING)], {"unique": True}),
+    ("bus_latest_location", [("geo", GEOSPHERE)], {}),
+    ("live_location_buckets", [("busId", ASCENDING), ("start", ASCENDING), ("driverId", ASCENDING)], {"unique": True}),
+    ("live_location_buckets", [("start", ASCENDING)], {}),
+    ("schedules", [("bus_id", ASCENDING)], {}),
+]
+
+# Representative query of each hot handler: (label, collection, filter, sort, expect_scan[, hint]).
+# expect_scan marks collections that are small by design (one document per bus, etc.)
+_SAMPLE_ID = ObjectId()
+_NOW = datetime.datetime.utcnow()
+_NEWEST_FIRST = [("createdAt", DESCENDING), ("_id", DESCENDING)]
+CANONICAL_QUERIES = [
+    ("token_required", "users", {"email": "audit@example.com"}, None, False),
+    ("login", "users", {"email": "audit@example.com"}, None, False),
+    ("forgot_password", "users", {"email": "audit@example.com", "is_verified": True}, None, False),
+    ("list_students", "users", {"role": "student"}, [("created_at", DESCENDING), ("_id", DESCENDING)], False),
+    ("register", "pending_users", {"email": "audit@example.com"}, None, False),
+    ("reset_password", "password_resets", {"email": "audit@example.com", "token": "x"}, None, False),
+    ("get_my_blood_requests", "blood_requests", {"userId": _SAMPLE_ID}, _NEWEST_FIRST, False),
+    ("get_all_blood_requests", "blood_requests", {}, _NEWEST_FIRST, False),
+    ("get_my_housing_posts", "housing_posts", {"userId": _SAMPLE_ID}, _NEWEST_FIRST, False),
+    ("list_housing_posts", "housing_posts", {}, _NEWEST_FIRST, False),
+    ("get_my_tutoring_posts", "tutoring_posts", {"userId": _SAMPLE_ID}, _NEWEST_FIRST, False),
+    ("get_all_tutoring_posts", "tutoring_posts", {}, _NEWEST_FIRST, False),
+    ("list_notices", "academic_notices", {}, _NEWEST_FIRST, False),
+    ("list_notices (after cursor)", "academic_notices",
+     {"$or": [{"createdAt": {"$lt": _NOW}}, {"createdAt": _NOW, "_id": {"$lt": _SAMPLE_ID}}]}, _NEWEST_FIRST, False),
+    ("get_locations", "bus_latest_location", {}, None, True),
+    ("get_bus_track", "live_locations", {"busId": _SAMPLE_ID, "timestamp": {"$gte": _NOW, "$lt": _NOW}}, [("timestamp", ASCENDING)], False),
+    ("get_bus_track (buckets)", "live_location_buckets", {"busId": _SAMPLE_ID, "start": {"$gte": _NOW, "$lt": _NOW}}, [("start", ASCENDING)], False),
+    ("apply_retention", "live_locations", {"timestamp": {"$lt": _NOW}}, None, False),
+    ("apply_retention (downsample)", "live_locations", {"timestamp": {"$gte": _NOW, "$lt": _NOW}},
+     [("busId", DESCENDING), ("timestamp", ASCENDING)], False, [("busId", ASCENDING), ("timestamp", DESCENDING)]),
+    ("token refresh", "refresh_tokens", {"token_hash": "x", "revoked": False, "expires_at": {"$gt": _NOW}}, None, False),
+    ("email outbox claim", "email_outbox", {"status": "pending", "next_attempt_at": {"$lte": _NOW}}, [("next_attempt_at", ASCENDING)], False),
+    ("eta routes", "schedules", {"stops.0": {"$exists": True}}, None, True),
+]
+
+def _index_name(keys):
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def ensure_indexes(replace=False, prune=False, database=None):
+    """Create every registered index; safe to run repeatedly.
+
+    replace: drop and recreate an existing index whose options changed.
+    prune: drop indexes on registered collections that are no longer registered.
+    Returns a list of (collection, index_name, status) tuples.
+    """
+    database = db if database is None else database
+    report = []
+    wanted = {}
+    for collection, keys, options in INDEXES:
+        name = options.get("name", _index_name(keys))
+        wanted.setdefault(collection, set()).add(name)
+        try:
+            database[collection].create_index(keys, name=name, **options)
+            report.append((collection, name, "ok"))
+        except OperationFailure as e:
+            # 85/86: an index with this name or key pattern exists with other options
+            if replace and e.code in (85, 86):
+                database[collection].drop_index(name)
+                try:
+                    database[collection].create_index(keys, name=name, **options)
+                    report.append((collection, name, "replaced"))
+                except OperationFailure as e:
+                    # e.g. a new unique index over duplicate values; fix the data and rerun
+                    report.append((collection, name, f"error: dropped, not recreated: {e}"))
+            else:
+                report.append((collection, name, f"error: {e}"))
+    if prune:
+        for collection, names in wanted.items():
+            for name in database[collection].index_information():
+                if name != "_id_" and name not in names:
+                    database[collection].drop_index(name)
+                    report.append((collection, name, "dropped"))
+    return report
+
+def ensure_indexes_on_connect(database):
+    # registered by create_app: unique and geo indexes are needed for correctness,
+    # so every process creates (or confirms) them on its first connection
+    for collection, name, status in ensure_indexes(database=database):
+        if status != "ok":
+            print(f"INDEX ERROR {collection}.{name}: {status}")
+
+def _stages(plan):
+    # every stage name in an explain() plan tree
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+def audit_queries():
+    """explain() every canonical query; returns a list of findings dicts."""
+    findings = []
+    for label, collection, query, sort, expect_scan, *hint in CANONICAL_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if hint:
+            cursor = cursor.hint(hint[0])
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(_stages(plan))
+        problems = []
+        if "COLLSCAN" in stages and not expect_scan:
+            problems.append("collection scan")
+        if "SORT" in stages:
+            problems.append("in-memory sort")
+        findings.append({
+            "query": label,
+            "collection": collection,
+            "stages": stages,
+            "problems": problems,
+        })
+    return findings
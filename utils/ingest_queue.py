@@ -0,0 +1,128 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from config import INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL
+
+class IngestQueue:
+    """Bounded write-behind queue that commits fixes in groups.
+
+    submit() never touches the database; a background thread flushes
+    whatever is queued once `batch_size` fixes are waiting or
+    `flush_interval` seconds have passed, whichever comes first.
+    """
+
+    def __init__(self, writer, maxsize=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE,
+                 flush_interval=INGEST_FLUSH_INTERVAL):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._counters = {
+            "enqueued": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "failed": 0,
+            "flushes": 0,
+            "flush_seconds_total": 0.0,
+            "flush_seconds_max": 0.0,
+            "flush_seconds_last": 0.0,
+        }
+
+    def _ensure_started(self):
+        # one flusher per process; a thread started before fork does not survive it
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+            self._thread.start()
+            if self._pid is None:
+                atexit.register(self.stop)
+            self._pid = os.getpid()
+
+    def submit(self, locations):
+        """Queue fixes in order; returns how many were accepted before the queue filled up."""
+        self._ensure_started()
+        accepted = 0
+        for location in locations:
+            try:
+                self._queue.put_nowait(location)
+            except queue.Full:
+                break
+            accepted += 1
+        with self._lock:
+            self._counters["enqueued"] += accepted
+            self._counters["dropped"] += len(locations) - accepted
+        return accepted
+
+    def _take_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            self.writer(batch)
+            ok = True
+        except Exception as e:
+            print(f"INGEST FLUSH ERROR: {e}")
+            ok = False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            c = self._counters
+            c["flushed" if ok else "failed"] += len(batch)
+            c["flushes"] += 1
+            c["flush_seconds_total"] += elapsed
+            c["flush_seconds_last"] = elapsed
+            c["flush_seconds_max"] = max(c["flush_seconds_max"], elapsed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+        self.drain()
+
+    def drain(self):
+        """Flush everything still queued (used on shutdown)."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._flush(batch)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.drain()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["depth"] = self._queue.qsize()
+        stats["capacity"] = self._queue.maxsize
+        stats["flush_seconds_avg"] = stats["flush_seconds_total"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
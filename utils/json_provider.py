@@ -0,0 +1,47 @@
+import datetime
+import json
+from bson import ObjectId, Decimal128
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # optional accelerator
+    orjson = None
+
+def bson_default(value):
+    """JSON form of BSON types; everything else as Flask's default provider does."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return http_date(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    return DefaultJSONProvider.default(value)
+
+if orjson is not None:
+    def encode(doc, sort_keys=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(doc, default=bson_default, option=option)
+else:
+    _encoder = json.JSONEncoder(default=bson_default, separators=(",", ":"), ensure_ascii=False)
+    _sorted_encoder = json.JSONEncoder(default=bson_default, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+
+    def encode(doc, sort_keys=False):
+        return (_sorted_encoder if sort_keys else _encoder).encode(doc).encode("utf-8")
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes Mongo documents as they come from pymongo.
+
+    ObjectId, datetime and Decimal128 are encoded at any depth in a single
+    pass, so handlers can return documents without converting fields.
+    """
+
+    default = staticmethod(bson_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs.get("indent"):
+            return encode(obj, sort_keys=kwargs.get("sort_keys", self.sort_keys)).decode("utf-8")
+        return super().dumps(obj, **kwargs)
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+from db import db_reads
+from config import LIVE_CACHE_TTL
+from utils.geo_index import GridIndex
+from utils.json_provider import encode
+
+def _public(location):
+    # bus_latest_location documents carry the fix id as locationId
+    return {
+        "_id": str(location.get("locationId", location["_id"])),
+        "busId": str(location["busId"]),
+        "driverId": str(location["driverId"]),
+        "latitude": location["latitude"],
+        "longitude": location["longitude"],
+        "timestamp": location["timestamp"],
+    }
+
+class LivePositionCache:
+    """In-memory snapshot of the latest position of every bus.
+
+    Every change bumps a monotonically increasing version (a wall-clock
+    millisecond stamp, never going backwards) that is recorded per bus, so
+    clients can ask for just the buses that moved since the version they
+    hold. The full snapshot is serialized once per change and reused for
+    every poll. Other workers' writes are picked up by reloading
+    bus_latest_location at most once every `ttl` seconds.
+    """
+
+    def __init__(self, ttl=LIVE_CACHE_TTL, removal_grace=30):
+        self.ttl = ttl
+        # a bus updated locally within this window may not be written yet (async ingest)
+        self.removal_grace = removal_grace
+        self.version = 0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._positions = {}
+        self._versions = {}
+        self._applied_at = {}
+        self._removed = {}
+        self.grid = GridIndex()
+        self._body = None
+        self._etag = None
+        self._loaded_at = None
+
+    def _next_version(self):
+        self.version = max(self.version + 1, int(time.time() * 1000))
+        return self.version
+
+    def _apply(self, location):
+        # caller holds self._lock
+        entry = _public(location)
+        bus_id = entry["busId"]
+        current = self._positions.get(bus_id)
+        if current and current["timestamp"] >= entry["timestamp"]:
+            return None
+        self._positions[bus_id] = entry
+        self.grid.update(bus_id, entry["latitude"], entry["longitude"])
+        self._versions[bus_id] = self._next_version()
+        self._applied_at[bus_id] = time.monotonic()
+        self._removed.pop(bus_id, None)
+        self._body = None
+        return entry
+
+    def update(self, location):
+        """Apply a new fix; returns its public form, or None if it was stale."""
+        with self._lock:
+            return self._apply(location)
+
+    def remove(self, bus_id):
+        bus_id = str(bus_id)
+        with self._lock:
+            if self._positions.pop(bus_id, None) is None:
+                return False
+            self.grid.remove(bus_id)
+            self._versions.pop(bus_id, None)
+            self._applied_at.pop(bus_id, None)
+            self._removed[bus_id] = self._next_version()
+            self._body = None
+            return True
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _reload_if_stale(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with self._reload_lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            docs = list(db_reads.bus_latest_location.find())
+            now = time.monotonic()
+            with self._lock:
+                seen = set()
+                for doc in docs:
+                    seen.add(str(doc["busId"]))
+                    self._apply(doc)
+                for bus_id in list(self._positions):
+                    if bus_id not in seen and now - self._applied_at.get(bus_id, 0) > self.removal_grace:
+                        del self._positions[bus_id]
+                        self.grid.remove(bus_id)
+                        self._versions.pop(bus_id, None)
+                        self._applied_at.pop(bus_id, None)
+                        self._removed[bus_id] = self._next_version()
+                        self._body = None
+            self._loaded_at = time.monotonic()
+
+    def snapshot(self):
+        """Return (version, etag, body) for the whole fleet."""
+        self._reload_if_stale()
+        with self._lock:
+            if self._body is None:
+                self._body = self.dumps(list(self._positions.values()))
+                self._etag = hashlib.blake2b(self._body, digest_size=12).hexdigest()
+            return self.version, self._etag, self._body
+
+    def changes_since(self, since_version):
+        """Return (version, moved, removed) for changes after since_version."""
+        self._reload_if_stale()
+        with self._lock:
+            moved = [self._positions[b] for b, v in self._versions.items() if v > since_version]
+            removed = [b for b, v in self._removed.items() if v > since_version]
+            return self.version, moved, removed
+
+    def positions(self):
+        self._reload_if_stale()
+        with self._lock:
+            return list(self._positions.values())
+
+    def nearby(self, latitude, longitude, radius_m, limit):
+        """Return [(distance_m, position)] within radius_m, closest first."""
+        self._reload_if_stale()
+        results = []
+        with self._lock:
+            for distance, bus_id in self.grid.nearest(latitude, longitude, radius_m, limit):
+                position = self._positions.get(bus_id)
+                if position is not None:
+                    results.append((distance, position))
+        return results
+
+    def get(self, bus_id):
+        self._reload_if_stale()
+        with self._lock:
+            return self._positions.get(str(bus_id))
+
+    @staticmethod
+    def dumps(payload):
+        return encode(payload, sort_keys=True)
+
+
+live_cache = LivePositionCache()
@@ -0,0 +1,130 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from db import db, db_writes
+from config import INGEST_MODE, LOCATION_STORAGE
+from utils.live_cache import live_cache
+from utils.broker import broker
+from utils.ingest_queue import IngestQueue
+from utils.history import write_history
+from utils.eta import eta_engine
+from utils.geo_index import point
+
+LATEST_FIELDS = ("driverId", "busId", "latitude", "longitude", "geo", "timestamp")
+
+def latest_document(location):
+    # locationId keeps the fix's own id, so every worker serves the same _id for it
+    return {"locationId": location["_id"], **{k: location[k] for k in LATEST_FIELDS}}
+
+def record_fix(location, route=None):
+    """Record one fix; returns False if async ingest had no room for it."""
+    accepted, _ = record_fixes([location], route)
+    return accepted == 1
+
+def record_fixes(locations, route=None):
+    """Record a batch of fixes for one bus; returns (accepted_count, failed_indexes)."""
+    if not locations:
+        return 0, []
+    for location in locations:
+        # ids are assigned up front so a fix can be published before (or without) a per-fix document
+        location.setdefault("_id", ObjectId())
+        location["geo"] = point(location["latitude"], location["longitude"])
+    if INGEST_MODE == "async":
+        accepted = ingest_queue.submit(locations)
+        failed = list(range(accepted, len(locations)))
+    else:
+        failed = write_history(locations)
+    failed_set = set(failed)
+    written = [loc for i, loc in enumerate(locations) if i not in failed_set]
+    if written:
+        newest = max(written, key=lambda loc: loc["timestamp"])
+        if INGEST_MODE != "async":
+            update_latest_location(newest)
+        publish_fix(newest, route)
+    return len(written), failed
+
+def write_fixes(locations):
+    # Group commit used by the async ingest flusher
+    failed = write_history(locations)
+    if failed:
+        print(f"INGEST: {len(failed)} of {len(locations)} fixes failed to write")
+    newest = {}
+    for location in locations:
+        current = newest.get(location["busId"])
+        if current is None or location["timestamp"] > current["timestamp"]:
+            newest[location["busId"]] = location
+    update_latest_locations(newest.values())
+
+def publish_fix(location, route=None):
+    entry = live_cache.update(location)
+    if entry is not None:
+        eta_engine.on_fix(location)
+        broker.publish(entry["busId"], live_cache.dumps(entry).decode("utf-8"), route)
+
+def update_latest_location(location):
+    # bus_latest_location keeps one document per bus; only move it forward in time
+    latest = latest_document(location)
+    try:
+        db_writes.bus_latest_location.update_one(
+            {"busId": location["busId"], "timestamp": {"$lt": location["timestamp"]}},
+            {"$set": latest},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # a newer fix is already stored for this bus
+        pass
+
+def update_latest_locations(locations):
+    requests = [
+        UpdateOne(
+            {"busId": loc["busId"], "timestamp": {"$lt": loc["timestamp"]}},
+            {"$set": latest_document(loc)},
+            upsert=True
+        )
+        for loc in locations
+    ]
+    if not requests:
+        return
+    try:
+        db_writes.bus_latest_location.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        # duplicate keys only mean a newer fix is already stored
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+def rebuild_latest_locations(storage=LOCATION_STORAGE):
+    # Backfill bus_latest_location from the full location history
+    merge = {"$merge": {"into": "bus_latest_location", "on": "busId", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    geo = {"$set": {"geo": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}
+    if storage == "buckets":
+        # newest bucket per bus, then the fix with the largest offset in it
+        pipeline = [
+            {"$sort": {"busId": 1, "last": -1}},
+            {"$group": {"_id": "$busId", "doc": {"$first": "$$ROOT"}}},
+            {"$set": {"newest": {"$indexOfArray": ["$doc.offsets", {"$max": "$doc.offsets"}]}}},
+            {"$project": {
+                "_id": 0,
+                "busId": "$_id",
+                "driverId": "$doc.driverId",
+                "latitude": {"$arrayElemAt": ["$doc.lat", "$newest"]},
+                "longitude": {"$arrayElemAt": ["$doc.lon", "$newest"]},
+                "timestamp": {"$add": ["$doc.start", {"$max": "$doc.offsets"}]},
+            }},
+            geo,
+            merge,
+        ]
+        db.live_location_buckets.aggregate(pipeline, allowDiskUse=True)
+        return db.bus_latest_location.count_documents({})
+
+    pipeline = [
+        {"$sort": {"busId": 1, "timestamp": -1}},
+        {"$group": {"_id": "$busId", "doc": {"$first": "$$ROOT"}}},
+        {"$project": {"_id": 0, "locationId": "$doc._id", **{k: f"$doc.{k}" for k in LATEST_FIELDS if k != "geo"}}},
+        geo,
+        merge,
+    ]
+    db.live_locations.aggregate(pipeline, allowDiskUse=True)
+    return db.bus_latest_location.count_documents({})
+
+
+ingest_queue = IngestQueue(write_fixes)
@@ -0,0 +1,185 @@
+import threading
+import time
+from flask import g, request
+from pymongo import monitoring
+from config import METRICS_DB_CALLS_WARN
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_CALL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus sense."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            labels = _labels(zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+def _labels(pairs):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class CommandMetrics(monitoring.CommandListener):
+    """Counts Mongo commands and their time, globally and for the current request.
+
+    pymongo publishes command events on the thread that runs the command,
+    so a thread-local holds the running request's tally.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.commands = {}  # command name -> [count, seconds, failures]
+
+    def begin_request(self):
+        self._local.tally = {"calls": 0, "seconds": 0.0, "commands": {}}
+
+    def end_request(self):
+        tally = getattr(self._local, "tally", None)
+        self._local.tally = None
+        return tally
+
+    def _record(self, event, failed):
+        seconds = event.duration_micros / 1e6
+        with self._lock:
+            entry = self.commands.setdefault(event.command_name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += failed
+        tally = getattr(self._local, "tally", None)
+        if tally is not None:
+            tally["calls"] += 1
+            tally["seconds"] += seconds
+            tally["commands"][event.command_name] = tally["commands"].get(event.command_name, 0) + 1
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, 0)
+
+    def failed(self, event):
+        self._record(event, 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: list(values) for name, values in self.commands.items()}
+
+
+request_latency = Histogram("http_request_duration_seconds", "Request latency by endpoint.",
+                            ("endpoint", "method", "status"), LATENCY_BUCKETS)
+request_db_calls = Histogram("http_request_db_calls", "MongoDB round trips per request.",
+                             ("endpoint", "method"), DB_CALL_BUCKETS)
+request_db_seconds = Histogram("http_request_db_seconds", "Time spent in MongoDB per request.",
+                               ("endpoint", "method"), LATENCY_BUCKETS)
+command_metrics = CommandMetrics()
+_listener_registered = False
+
+def init_app(app, db_calls_warn=METRICS_DB_CALLS_WARN):
+    """Time every request and count its Mongo round trips.
+
+    Streaming responses (SSE, exports) are timed to the first byte only.
+    A request making more than db_calls_warn round trips is logged.
+    """
+    # clients created from now on report their commands; db handles connect lazily
+    global _listener_registered
+    if not _listener_registered:
+        monitoring.register(command_metrics)
+        _listener_registered = True
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        command_metrics.begin_request()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        tally = command_metrics.end_request()
+        if started is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        request_latency.observe(time.perf_counter() - started, endpoint, request.method, response.status_code)
+        if tally is not None:
+            request_db_calls.observe(tally["calls"], endpoint, request.method)
+            request_db_seconds.observe(tally["seconds"], endpoint, request.method)
+            if db_calls_warn and tally["calls"] > db_calls_warn:
+                commands = ", ".join(f"{name}={count}" for name, count in sorted(tally["commands"].items()))
+                print(f"DB CALLS {request.method} {request.path} ({endpoint}): {tally['calls']} round trips, "
+                      f"{tally['seconds'] * 1000:.1f}ms [{commands}]")
+        return response
+
+def _counters(prefix, values, label):
+    # values: {label value: {name: number}}
+    lines = []
+    names = sorted({name for stats in values.values() for name in stats})
+    for name in names:
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        for label_value, stats in sorted(values.items()):
+            if name in stats:
+                lines.append(f"{prefix}_{name}{{{_labels([(label, label_value)])}}} {stats[name]}")
+    return lines
+
+def _gauges(prefix, values, label=None):
+    # values: {name: number} or, with label, {label value: {name: number}}; non-numbers are skipped
+    if label is None:
+        values = {None: values}
+    series = {}
+    for label_value, stats in values.items():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                labels = f"{{{_labels([(label, label_value)])}}}" if label else ""
+                series.setdefault(f"{prefix}_{key}", []).append(f"{prefix}_{key}{labels} {value}")
+    lines = []
+    for metric in sorted(series):
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(series[metric])
+    return lines
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    from db import HANDLES
+    from utils.locations import ingest_queue  # imported late: these pull in the whole app
+    from utils.principal_cache import principal_cache
+    from utils.hashing import hashing
+    from utils.tokens import revocations
+
+    lines = request_latency.render() + request_db_calls.render() + request_db_seconds.render()
+    commands = {name: {"total": count, "seconds_total": round(seconds, 6), "failures_total": failures}
+                for name, (count, seconds, failures) in command_metrics.snapshot().items()}
+    lines += _counters("mongo_command", commands, label="command")
+    lines += _gauges("mongo_pool", {handle.label: handle.stats() for handle in HANDLES}, label="handle")
+    lines += _gauges("ingest_queue", ingest_queue.stats())
+    lines += _gauges("principal_cache", principal_cache.stats())
+    lines += _gauges("password_hashing", hashing.stats())
+    lines += _gauges("token_revocations", revocations.stats())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,192 @@
+import atexit
+import datetime
+import os
+import random
+import threading
+import time
+from pymongo import ReturnDocument
+from db import db
+from config import (EMAIL_BACKEND, EMAIL_WORKERS, EMAIL_RATE_PER_SECOND, EMAIL_BATCH_SIZE,
+                    EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BASE_SECONDS, EMAIL_POLL_INTERVAL)
+from utils.email_backends import get_backend
+
+LOCK_TIMEOUT = datetime.timedelta(minutes=5)  # a "sending" message older than this is retried
+
+class RateLimiter:
+    """Token bucket shared by all outbox workers of a process, one token per message.
+
+    The limit is per process: with several web workers (or a separate
+    send-outbox process) the provider sees up to rate x processes.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if self.rate <= 0:
+            return
+        if tokens > self.capacity:
+            raise ValueError(f"cannot acquire {tokens} tokens from a bucket of {self.capacity:g}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def chunk_size(self, count):
+        """Largest share of `count` messages that can be sent in one go."""
+        if self.rate <= 0:
+            return max(1, count)
+        return max(1, min(count, int(self.capacity)))
+
+class EmailOutbox:
+    """Mongo-backed email queue drained by a small pool of worker threads.
+
+    Messages survive restarts and are shared by every worker process:
+    each one is claimed atomically before it is sent, and failed sends
+    are retried with exponential backoff up to EMAIL_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, backend_name=EMAIL_BACKEND, workers=EMAIL_WORKERS):
+        self.backend_name = backend_name
+        self.workers = workers
+        self.limiter = RateLimiter(EMAIL_RATE_PER_SECOND)
+        self._backend = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend(self.backend_name)
+        return self._backend
+
+    def enqueue(self, to_email, subject, html, text=None):
+        return self.enqueue_many([{"to": to_email, "subject": subject, "html": html, "text": text}])[0]
+
+    def enqueue_many(self, messages):
+        if not messages:
+            return []
+        now = datetime.datetime.utcnow()
+        docs = [{
+            "to": m["to"],
+            "subject": m["subject"],
+            "html": m["html"],
+            "text": m.get("text"),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        } for m in messages]
+        res = db.email_outbox.insert_many(docs)
+        self.start()
+        self._wake.set()
+        return res.inserted_ids
+
+    def start(self):
+        # worker threads are per process; start them after fork, on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"email-outbox-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            if self._pid is None:
+                atexit.register(self.stop)
+            self._pid = os.getpid()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _claim(self, limit):
+        now = datetime.datetime.utcnow()
+        query = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_at": {"$lt": now - LOCK_TIMEOUT}},
+        ]}
+        claimed = []
+        while len(claimed) < limit:
+            message = db.email_outbox.find_one_and_update(
+                query,
+                {"$set": {"status": "sending", "locked_at": now}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if message is None:
+                break
+            claimed.append(message)
+        return claimed
+
+    def _record(self, message, error):
+        now = datetime.datetime.utcnow()
+        if error is None:
+            db.email_outbox.update_one(
+                {"_id": message["_id"]},
+                {"$set": {"status": "sent", "sent_at": now}, "$unset": {"locked_at": ""}}
+            )
+            return
+        attempts = message.get("attempts", 0) + 1
+        update = {"attempts": attempts, "last_error": error}
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            update["status"] = "failed"
+            print(f"EMAIL TO {message['to']} FAILED after {attempts} attempts: {error}")
+        else:
+            delay = EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+            update["status"] = "pending"
+            update["next_attempt_at"] = now + datetime.timedelta(seconds=delay)
+        db.email_outbox.update_one({"_id": message["_id"]}, {"$set": update, "$unset": {"locked_at": ""}})
+
+    def process_once(self):
+        """Claim and send one batch; returns how many messages were attempted."""
+        messages = self._claim(EMAIL_BATCH_SIZE)
+        if not messages:
+            return 0
+        size = self.limiter.chunk_size(len(messages))
+        for start in range(0, len(messages), size):
+            # a claimed batch larger than the bucket is sent in rate-limited chunks
+            chunk = messages[start:start + size]
+            self.limiter.acquire(len(chunk))
+            errors = self.backend.send_batch(chunk)
+            for message, error in zip(chunk, errors):
+                self._record(message, error)
+        return len(messages)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.process_once():
+                    continue
+            except Exception as e:
+                print(f"EMAIL OUTBOX ERROR: {e}")
+            self._wake.wait(EMAIL_POLL_INTERVAL)
+            self._wake.clear()
+
+    def stats(self):
+        counts = {s: 0 for s in ("pending", "sending", "sent", "failed")}
+        for row in db.email_outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+
+outbox = EmailOutbox()
@@ -0,0 +1,101 @@
+import base64
+import datetime
+import json
+import threading
+import time
+from urllib.parse import urlencode
+from bson import ObjectId
+from flask import request, jsonify
+from config import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT, COUNT_CACHE_TTL
+from db import db_reads
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+def encode_cursor(value, _id):
+    if isinstance(value, datetime.datetime):
+        payload = {"d": value.isoformat(), "id": str(_id)}
+    else:
+        payload = {"v": value, "id": str(_id)}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token):
+    """Return (sort_value, ObjectId); raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        value = datetime.datetime.fromisoformat(payload["d"]) if "d" in payload else payload["v"]
+        return value, ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def page_limit(default=PAGE_DEFAULT_LIMIT, maximum=PAGE_MAX_LIMIT):
+    limit = request.args.get('limit', default=default, type=int)
+    return max(1, min(limit, maximum))
+
+def projection_for(allowed_fields, exclude=None):
+    # ?fields=a,b limited to allowed_fields; otherwise everything minus `exclude`.
+    # An empty inclusion would return every field, so it falls back to the exclusion too
+    exclude = exclude or ()
+    requested = [f for f in request.args.get('fields', '').split(',') if f]
+    included = {f: 1 for f in requested if f in allowed_fields and f not in exclude}
+    if included:
+        return included
+    return {f: 0 for f in exclude} if exclude else None
+
+def cached_count(collection, query):
+    """Total for a query; estimated for the whole collection, cached for COUNT_CACHE_TTL otherwise."""
+    collection = db_reads[collection.name]
+    if not query:
+        return collection.estimated_document_count()
+    key = (collection.name, repr(sorted(query.items())))
+    now = time.monotonic()
+    with _count_lock:
+        entry = _count_cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    total = collection.count_documents(query)
+    with _count_lock:
+        _count_cache[key] = (now + COUNT_CACHE_TTL, total)
+    return total
+
+def keyset_page(collection, query=None, sort_field="createdAt", projection=None, limit=None):
+    """One page sorted newest first by (sort_field, _id), continuing from ?after=.
+
+    Returns (docs, next_cursor); raises ValueError for a bad cursor.
+    Pages are read through db_reads, so listings may be served by a secondary.
+    """
+    collection = db_reads[collection.name]
+    limit = limit or page_limit()
+    query = dict(query or {})
+    if projection and any(projection.values()):
+        # the cursor is built from the sort field, so always fetch it
+        projection = {**projection, sort_field: 1}
+    after = request.args.get('after')
+    if after:
+        value, last_id = decode_cursor(after)
+        keyset = {"$or": [{sort_field: {"$lt": value}}, {sort_field: value, "_id": {"$lt": last_id}}]}
+        query = {"$and": [query, keyset]} if query else keyset
+    cursor = collection.find(query, projection).sort([(sort_field, -1), ("_id", -1)]).limit(limit + 1)
+    docs = list(cursor)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1].get(sort_field), docs[-1]["_id"])
+    return docs, next_cursor
+
+def wants_total():
+    return request.args.get('count', '').lower() in ('1', 'true')
+
+def page_response(docs, next_cursor, total=None):
+    # list body stays a plain array; paging details travel in headers
+    response = jsonify(docs)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        args = request.args.to_dict()
+        args["after"] = next_cursor
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return response, 200
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
+
+class PrincipalCache:
+    """Bounded TTL/LRU cache of user documents keyed by token subject (email)."""
+
+    def __init__(self, maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._emails_by_id = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, email):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._drop(email)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, email, user):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if email in self._entries:
+                self._drop(email)
+            self._entries[email] = (time.monotonic() + self.ttl, user)
+            self._emails_by_id[str(user["_id"])] = email
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, email):
+        # caller holds self._lock
+        _, user = self._entries.pop(email)
+        self._emails_by_id.pop(str(user["_id"]), None)
+
+    def invalidate(self, email=None, user_id=None):
+        with self._lock:
+            if email is None and user_id is not None:
+                email = self._emails_by_id.get(str(user_id))
+            if email in self._entries:
+                self._drop(email)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._emails_by_id.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,119 @@
+import cProfile
+import marshal
+import pstats
+import random
+import threading
+import jwt
+from flask import g, request
+from config import SECRET_KEY, JWT_ALGORITHM, PROFILER_SAMPLE_RATE, PROFILER_ENDPOINTS
+
+class RequestProfiler:
+    """Runs cProfile around selected requests and aggregates the stats per endpoint.
+
+    A request is profiled when its endpoint is selected and it is sampled
+    (sample_rate), or when an admin asks for it with an "X-Profile: 1"
+    header or ?_profile=1. Nothing is installed unless PROFILER_ENABLED is
+    set, so the disabled cost is zero. Settings and results are per process.
+    """
+
+    def __init__(self, sample_rate=PROFILER_SAMPLE_RATE, endpoints=PROFILER_ENDPOINTS):
+        self.sample_rate = sample_rate
+        self.endpoints = set(endpoints)  # empty = every endpoint
+        self._stats = {}  # endpoint -> pstats.Stats
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.teardown_request(self._stop)
+        app.extensions["profiler"] = self
+
+    def _selected(self):
+        if request.headers.get("X-Profile") == "1" or request.args.get("_profile") == "1":
+            return _is_admin()
+        if self.sample_rate <= 0 or (self.endpoints and request.endpoint not in self.endpoints):
+            return False
+        return random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._selected():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return  # another profiler is active on this thread
+        g._profile = profile
+
+    def _stop(self, exc=None):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return
+        profile.disable()
+        endpoint = request.endpoint or "unmatched"
+        stats = pstats.Stats(profile)
+        with self._lock:
+            if endpoint in self._stats:
+                self._stats[endpoint].add(stats)
+            else:
+                self._stats[endpoint] = stats
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def configure(self, sample_rate=None, endpoints=None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if endpoints is not None:
+            self.endpoints = set(endpoints)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._counts.clear()
+
+    def summary(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {"sample_rate": self.sample_rate, "endpoints": sorted(self.endpoints), "profiled": counts}
+
+    def top(self, endpoint, limit=20, sort="cumulative"):
+        """The hottest functions for an endpoint, or None if it was never profiled."""
+        key = 3 if sort == "cumulative" else 2  # pstats rows: (cc, nc, tottime, cumtime, callers)
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                return None
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+            requests = self._counts[endpoint]
+        return [{
+            "function": func,
+            "file": filename,
+            "line": line,
+            "calls": nc,
+            "primitive_calls": cc,
+            "total_seconds": round(tottime, 6),
+            "cumulative_seconds": round(cumtime, 6),
+            "cumulative_ms_per_request": round(cumtime / requests * 1000, 3),
+        } for (filename, line, func), (cc, nc, tottime, cumtime, _) in rows]
+
+    def dump(self, endpoint):
+        """Raw pstats data (the format Stats.dump_stats writes), or None."""
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            return marshal.dumps(stats.stats) if stats is not None else None
+
+def _is_admin():
+    # forced profiling is admin-only; checked from the access token alone
+    auth_header = request.headers.get('Authorization', '')
+    if " " not in auth_header:
+        return False
+    try:
+        claims = jwt.decode(auth_header.split(" ")[1], SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        return False
+    if claims.get("type") != "access" or claims.get("role") != "admin":
+        return False
+    from utils.tokens import revocations
+    return not revocations.is_revoked(claims)
+
+
+profiler = RequestProfiler()
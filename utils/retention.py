@@ -0,0 +1,123 @@
+import datetime
+from pymongo import UpdateOne, ASCENDING, DESCENDING
+from db import db
+from config import RETENTION_FULL_DAYS, RETENTION_DOWNSAMPLE_SECONDS, RETENTION_DELETE_DAYS, LOCATION_STORAGE
+from utils.history import write_buckets, bucket_start
+
+DOWNSAMPLE_SORT = [("busId", DESCENDING), ("timestamp", ASCENDING)]
+DOWNSAMPLE_INDEX = [("busId", ASCENDING), ("timestamp", DESCENDING)]
+
+def downsample(offsets, lat, lon, interval_ms):
+    # keep the first fix of every interval, in time order
+    kept_offsets, kept_lat, kept_lon = [], [], []
+    last = None
+    for offset, la, lo in sorted(zip(offsets, lat, lon)):
+        if last is None or offset - last >= interval_ms:
+            kept_offsets.append(offset)
+            kept_lat.append(la)
+            kept_lon.append(lo)
+            last = offset
+    return kept_offsets, kept_lat, kept_lon
+
+def apply_retention(now=None, batch_size=500):
+    """Downsample history older than RETENTION_FULL_DAYS and delete history older than RETENTION_DELETE_DAYS."""
+    now = now or datetime.datetime.utcnow()
+    delete_before = now - datetime.timedelta(days=RETENTION_DELETE_DAYS)
+    downsample_before = now - datetime.timedelta(days=RETENTION_FULL_DAYS)
+    interval_ms = RETENTION_DOWNSAMPLE_SECONDS * 1000
+
+    result = {
+        "deleted_buckets": db.live_location_buckets.delete_many({"start": {"$lt": delete_before}}).deleted_count,
+        "deleted_documents": db.live_locations.delete_many({"timestamp": {"$lt": delete_before}}).deleted_count,
+        "downsampled_buckets": 0,
+    }
+
+    cursor = db.live_location_buckets.find(
+        {"start": {"$lt": downsample_before}, "downsampled": False},
+        {"offsets": 1, "lat": 1, "lon": 1}
+    )
+    requests = []
+    for bucket in cursor:
+        offsets, lat, lon = downsample(bucket["offsets"], bucket["lat"], bucket["lon"], interval_ms)
+        requests.append(UpdateOne(
+            {"_id": bucket["_id"]},
+            {"$set": {"offsets": offsets, "lat": lat, "lon": lon, "count": len(offsets), "downsampled": True}}
+        ))
+        if len(requests) >= batch_size:
+            db.live_location_buckets.bulk_write(requests, ordered=False)
+            result["downsampled_buckets"] += len(requests)
+            requests = []
+    if requests:
+        db.live_location_buckets.bulk_write(requests, ordered=False)
+        result["downsampled_buckets"] += len(requests)
+
+    if LOCATION_STORAGE != "buckets":
+        # per-fix documents cannot be packed in place, so thin them out instead;
+        # only the fixes that aged past RETENTION_FULL_DAYS since the last run
+        state = db.retention_state.find_one({"_id": "live_locations"}) or {}
+        start = max(delete_before, state.get("downsampled_until", delete_before))
+        if start < downsample_before:
+            result["deleted_documents"] += _downsample_documents(start, downsample_before, interval_ms)
+            db.retention_state.update_one(
+                {"_id": "live_locations"}, {"$set": {"downsampled_until": downsample_before}}, upsert=True
+            )
+    return result
+
+def _downsample_documents(start, end, interval_ms, batch_size=1000):
+    removed = 0
+    doomed = []
+    last = {}
+    # (busId -1, timestamp 1) walks the (busId 1, timestamp -1) index backwards, no in-memory sort
+    cursor = db.live_locations.find(
+        {"timestamp": {"$gte": start, "$lt": end}},
+        {"busId": 1, "timestamp": 1}
+    ).sort(DOWNSAMPLE_SORT).hint(DOWNSAMPLE_INDEX)
+    for doc in cursor:
+        previous = last.get(doc["busId"])
+        if previous is not None and (doc["timestamp"] - previous).total_seconds() * 1000 < interval_ms:
+            doomed.append(doc["_id"])
+        else:
+            last[doc["busId"]] = doc["timestamp"]
+        if len(doomed) >= batch_size:
+            removed += db.live_locations.delete_many({"_id": {"$in": doomed}}).deleted_count
+            doomed = []
+    if doomed:
+        removed += db.live_locations.delete_many({"_id": {"$in": doomed}}).deleted_count
+    return removed
+
+def migrate_to_buckets(batch_size=5000, keep_source=False):
+    """Pack existing live_locations documents into live_location_buckets.
+
+    Safe to re-run: fixes a bucket already holds (by source _id) are skipped,
+    so a second pass with keep_source, or a resume after a crash, adds nothing twice.
+    """
+    migrated = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = list(db.live_locations.find(query).sort("_id", 1).limit(batch_size))
+        if not docs:
+            return migrated
+        pending = _not_yet_migrated(docs)
+        failed = set(write_buckets(pending, migrating=True))
+        if failed:
+            raise RuntimeError(f"{len(failed)} fixes failed to migrate; source documents left in place")
+        if not keep_source:
+            db.live_locations.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        migrated += len(pending)
+        last_id = docs[-1]["_id"]
+
+def _not_yet_migrated(docs):
+    starts = {bucket_start(d["timestamp"]) for d in docs}
+    buckets = db.live_location_buckets.find(
+        {"busId": {"$in": list({d["busId"] for d in docs})}, "start": {"$in": list(starts)},
+         "migrated_upto": {"$exists": True}},
+        {"busId": 1, "driverId": 1, "start": 1, "migrated_upto": 1}
+    )
+    upto = {(b["busId"], b["driverId"], b["start"]): b["migrated_upto"] for b in buckets}
+    pending = []
+    for d in docs:
+        merged = upto.get((d["busId"], d["driverId"], bucket_start(d["timestamp"])))
+        if merged is None or d["_id"] > merged:
+            pending.append(d)
+    return pending
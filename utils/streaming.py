@@ -0,0 +1,40 @@
+from flask import current_app, stream_with_context
+from utils.json_provider import encode
+
+CHUNK_SIZE = 64 * 1024  # bytes buffered before each write to the response
+
+def _chunked(parts):
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+def iter_json_array(docs):
+    def parts():
+        yield b"["
+        first = True
+        for doc in docs:
+            if not first:
+                yield b","
+            yield encode(doc)
+            first = False
+        yield b"]"
+    return _chunked(parts())
+
+def iter_ndjson(docs):
+    return _chunked(encode(doc) + b"\n" for doc in docs)
+
+STREAM_FORMATS = {
+    "json": (iter_json_array, "application/json"),
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+}
+
+def stream_response(docs, output="json"):
+    """Chunked response encoding documents (e.g. a pymongo cursor) one at a time."""
+    iterator, mimetype = STREAM_FORMATS[output]
+    return current_app.response_class(stream_with_context(iterator(docs)), mimetype=mimetype)
@@ -0,0 +1,189 @@
+import atexit
+import datetime
+import hashlib
+import os
+import secrets
+import threading
+import time
+import uuid
+import jwt
+from bson import ObjectId
+from db import db
+from config import SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_MINUTES, REFRESH_TOKEN_DAYS, REVOCATION_SYNC_SECONDS
+from utils.bloom import BloomFilter
+
+# Access tokens are short-lived JWTs carrying everything authorization needs
+# (sub, role, email, bus), so token_required does not read the database.
+# Refresh tokens are opaque, stored hashed in refresh_tokens and rotated on use.
+
+def issue_access_token(user):
+    now = time.time()
+    bus = (user.get("driver_info") or {}).get("assigned_bus")
+    payload = {
+        "type": "access",
+        "sub": str(user["_id"]),
+        "email": user["email"],
+        "role": user["role"],
+        "bus": str(bus) if bus else None,
+        "jti": uuid.uuid4().hex,
+        "iat": now,  # float, so a token minted right after a revocation is still accepted
+        "exp": int(now + ACCESS_TOKEN_MINUTES * 60),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def principal_from_claims(claims):
+    """The current_user dict handed to views for an access token."""
+    user = {"_id": ObjectId(claims["sub"]), "email": claims.get("email"), "role": claims.get("role")}
+    if claims.get("bus"):
+        user["driver_info"] = {"assigned_bus": ObjectId(claims["bus"])}
+    return user
+
+def _hash_refresh_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def issue_refresh_token(user_id):
+    token = secrets.token_urlsafe(32)
+    now = datetime.datetime.utcnow()
+    db.refresh_tokens.insert_one({
+        "token_hash": _hash_refresh_token(token),
+        "user_id": ObjectId(user_id),
+        "created_at": now,
+        "expires_at": now + datetime.timedelta(days=REFRESH_TOKEN_DAYS),
+        "revoked": False,
+    })
+    return token
+
+def issue_tokens(user):
+    return {
+        "access_token": issue_access_token(user),
+        "refresh_token": issue_refresh_token(user["_id"]),
+        "token_type": "Bearer",
+        "expires_in": ACCESS_TOKEN_MINUTES * 60,
+    }
+
+def use_refresh_token(token):
+    """Consumes a refresh token and returns its user id, or None if it is not valid.
+
+    Presenting a token that was already rotated means it leaked (or the
+    client replayed it), so every session of that user is revoked.
+    """
+    token_hash = _hash_refresh_token(token)
+    now = datetime.datetime.utcnow()
+    doc = db.refresh_tokens.find_one_and_update(
+        {"token_hash": token_hash, "revoked": False, "expires_at": {"$gt": now}},
+        {"$set": {"revoked": True, "revoked_at": now}}
+    )
+    if doc:
+        return doc["user_id"]
+    stale = db.refresh_tokens.find_one({"token_hash": token_hash, "revoked": True}, {"user_id": 1})
+    if stale:
+        revoke_user(stale["user_id"])
+    return None
+
+def revoke_refresh_token(token):
+    db.refresh_tokens.update_one(
+        {"token_hash": _hash_refresh_token(token)},
+        {"$set": {"revoked": True, "revoked_at": datetime.datetime.utcnow()}}
+    )
+
+def revoke_user(user_id, refresh_tokens=True):
+    """Rejects the user's current access tokens; with refresh_tokens also ends their sessions.
+
+    Use refresh_tokens=False when only the claims changed (e.g. a new bus),
+    so clients pick up the change with their next refresh.
+    """
+    revocations.add(f"user:{user_id}")
+    if refresh_tokens:
+        db.refresh_tokens.update_many(
+            {"user_id": ObjectId(user_id), "revoked": False},
+            {"$set": {"revoked": True, "revoked_at": datetime.datetime.utcnow()}}
+        )
+
+def revoke_access_token(claims):
+    if claims.get("jti"):
+        revocations.add(f"jti:{claims['jti']}", expires_at=claims.get("exp"))
+
+class RevocationList:
+    """Denylist of revoked users and access tokens, mirrored in every process.
+
+    Entries live in token_revocations only as long as an access token can,
+    so the list stays small. Each process reloads it every
+    REVOCATION_SYNC_SECONDS in a background thread; requests only consult an
+    in-memory Bloom filter and, on a hit, the exact map behind it.
+    """
+
+    def __init__(self, sync_interval=REVOCATION_SYNC_SECONDS):
+        self.sync_interval = sync_interval
+        self._entries = {}  # key -> revoked_at (epoch seconds)
+        self._bloom = BloomFilter()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            try:
+                self.sync()  # load revocations made by other workers before the first check
+            except Exception as e:
+                print(f"TOKEN REVOCATION SYNC ERROR: {e}")
+            threading.Thread(target=self._run, name="token-revocations", daemon=True).start()
+            if self._pid is None:
+                atexit.register(self._stop.set)
+            self._pid = os.getpid()
+
+    def add(self, key, expires_at=None):
+        now = time.time()
+        expires_at = expires_at or now + ACCESS_TOKEN_MINUTES * 60
+        db.token_revocations.update_one(
+            {"key": key},
+            {"$set": {"revoked_at": now, "expires_at": datetime.datetime.utcfromtimestamp(expires_at)}},
+            upsert=True
+        )
+        with self._lock:
+            self._entries[key] = now
+            self._bloom.add(key)
+
+    def is_revoked(self, claims):
+        self._ensure_started()
+        bloom = self._bloom
+        for key in (f"user:{claims.get('sub')}", f"jti:{claims.get('jti')}"):
+            if key in bloom:
+                revoked_at = self._entries.get(key)
+                if revoked_at is not None and claims.get("iat", 0) <= revoked_at:
+                    return True
+        return False
+
+    def sync(self):
+        now = datetime.datetime.utcnow()
+        entries = {doc["key"]: doc["revoked_at"] for doc in db.token_revocations.find(
+            {"expires_at": {"$gt": now}}, {"key": 1, "revoked_at": 1})}
+        bloom = BloomFilter(capacity=max(10000, len(entries) * 2))
+        for key in entries:
+            bloom.add(key)
+        with self._lock:
+            # keep entries added locally since the query ran
+            for key, revoked_at in self._entries.items():
+                if key not in entries and revoked_at > time.time() - self.sync_interval:
+                    entries[key] = revoked_at
+                    bloom.add(key)
+            self._entries = entries
+            self._bloom = bloom
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"TOKEN REVOCATION SYNC ERROR: {e}")
+
+    def stats(self):
+        return {"entries": len(self._entries), "bloom_bits": self._bloom.size, "bloom_hashes": self._bloom.hashes}
+
+
+revocations = RevocationList()
@@ -0,0 +1,90 @@
+import math
+
+_numpy = False  # not yet imported; numpy costs ~60ms at import and only track requests need it
+
+def _get_numpy():
+    # numpy is optional; the pure-Python path gives the same result
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+METERS_PER_DEGREE = 111320.0
+
+def _project(points):
+    # equirectangular projection around the chunk's first point, in meters
+    lat0 = math.radians(points[0][1])
+    scale_x = METERS_PER_DEGREE * math.cos(lat0)
+    return [(p[2] * scale_x, p[1] * METERS_PER_DEGREE) for p in points]
+
+def _farthest_numpy(xy, first, last):
+    np = _numpy
+    start, end = xy[first], xy[last]
+    seg = end - start
+    inner = xy[first + 1:last]
+    length = math.hypot(seg[0], seg[1])
+    if length == 0:
+        distances = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+    else:
+        distances = np.abs(seg[0] * (inner[:, 1] - start[1]) - seg[1] * (inner[:, 0] - start[0])) / length
+    i = int(np.argmax(distances))
+    return first + 1 + i, float(distances[i])
+
+def _farthest_python(xy, first, last):
+    (x1, y1), (x2, y2) = xy[first], xy[last]
+    dx, dy = x2 - x1, y2 - y1
+    length = math.hypot(dx, dy)
+    best, best_distance = first + 1, -1.0
+    for i in range(first + 1, last):
+        x, y = xy[i]
+        if length == 0:
+            distance = math.hypot(x - x1, y - y1)
+        else:
+            distance = abs(dx * (y - y1) - dy * (x - x1)) / length
+        if distance > best_distance:
+            best, best_distance = i, distance
+    return best, best_distance
+
+def simplify(points, tolerance):
+    """Douglas-Peucker over (timestamp, lat, lon) points; tolerance in meters."""
+    if tolerance <= 0 or len(points) < 3:
+        return list(points)
+    xy = _project(points)
+    farthest = _farthest_python
+    np = _get_numpy()
+    if np is not None:
+        xy = np.asarray(xy)
+        farthest = _farthest_numpy
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        index, distance = farthest(xy, first, last)
+        if distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+def simplify_stream(points, tolerance, chunk_size=2000):
+    """Simplify an iterable of points chunk by chunk so memory stays bounded.
+
+    Consecutive chunks share their boundary point, so the output is a
+    continuous track.
+    """
+    chunk = []
+    for point in points:
+        chunk.append(point)
+        if len(chunk) >= chunk_size:
+            simplified = simplify(chunk, tolerance)
+            yield from simplified[:-1]
+            chunk = [chunk[-1]]
+    if chunk:
+        yield from simplify(chunk, tolerance)